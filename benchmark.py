@@ -0,0 +1,193 @@
+'''
+benchmarks the scrape pipeline against a local farm of synthetic sites.
+Farm shape, scraper settings and the modes to run are set in
+conf/benchmark.yml, modes can also be passed as arguments:
+
+    python benchmark.py site_group scrape pool
+
+Every mode runs in a fresh process, so peak memory of one mode does not hide
+another one. Results are printed and appended to data/benchmarks/results.jsonl,
+which combine_results.py does not mistake for a scrape output
+'''
+import asyncio
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import yaml
+
+import scrape
+from multiprocessing_scrape import CONF_PATH, OUTPUT_PATH, TIME_FORMAT, load_settings
+from src.dns_cache import DnsCache
+from src.fetch_engine import FetchEngine
+from src.metrics import MetricsReporter
+from src.mock_farm import FarmConfig, MockFarm
+from src.settings import Settings
+from src.site_group import SiteGroup
+from src.worker_pool import SitePool
+
+BENCHMARK_PATH = OUTPUT_PATH / 'benchmarks'
+
+
+async def run_site_groups(site_links: List[str], settings: Settings) -> List[Dict]:
+    '''runs every site as a SiteGroup on a single engine'''
+    async with FetchEngine(settings) as engine:
+        site_groups = [SiteGroup(link=link, settings=settings) for link in site_links]
+        await asyncio.gather(*(site_group.run(engine) for site_group in site_groups))
+
+    return [site_group.combined_dict for site_group in site_groups]
+
+
+async def run_scrape(site_links: List[str], settings: Settings) -> List[Dict]:
+    '''runs chunks of sites the way scrape.py does'''
+    chunk_size = 20
+    async with FetchEngine(settings) as engine:
+        chunks = await asyncio.gather(*(
+            scrape.parse_site_groups(site_links[i:i + chunk_size], settings, idx, engine)
+            for idx, i in enumerate(range(0, len(site_links), chunk_size))
+        ))
+
+    return [combined_dict for chunk in chunks for combined_dict in chunk.values()]
+
+
+def run_pool(site_links: List[str], settings: Settings) -> List[Dict]:
+    '''runs sites in the worker pool the way multiprocessing_scrape.py does'''
+    return [combined_dict for _, combined_dict in SitePool(settings).imap(site_links)]
+
+
+MODES: Dict[str, Callable[[List[str], Settings], Any]] = {
+    'site_group': run_site_groups,
+    'scrape': run_scrape,
+    'pool': run_pool,
+}
+
+
+def percentile(values: List[float], share: float) -> float:
+    '''returns the value below which the share of sorted values falls'''
+    if not values:
+        return 0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def measure(
+    mode: str,
+    site_links: List[str],
+    requests: Any,
+    settings: Settings,
+    results: Any,
+) -> None:
+    '''
+    runs a single mode and puts its statistics into the results queue
+    pages are requests served by the farm, latency is that of main page requests.
+    Stage metrics of the mode are saved to data/benchmarks/metrics/<mode>
+    '''
+    settings.metrics_path = str(BENCHMARK_PATH / 'metrics' / mode)
+    start_requests = requests.value
+    start_time = time.perf_counter()
+    start_cpu = _get_cpu_time()
+
+    with MetricsReporter(settings, merge=True):
+        combined_dicts = MODES[mode](site_links, settings)
+        if asyncio.iscoroutine(combined_dicts):
+            combined_dicts = asyncio.run(combined_dicts)
+
+    wall_time = time.perf_counter() - start_time
+    cpu_time = _get_cpu_time() - start_cpu
+    pages = requests.value - start_requests
+    latencies = [
+        combined_dict['fetch time'] for combined_dict in combined_dicts
+        if combined_dict.get('fetch time') is not None
+    ]
+    results.put({
+        'mode': mode,
+        'sites': len(combined_dicts),
+        'failed sites': sum(bool(combined_dict['fetch error']) for combined_dict in combined_dicts),
+        'pages': pages,
+        'seconds': round(wall_time, 3),
+        'pages/sec': round(pages / wall_time, 1) if wall_time else 0,
+        'p50 latency': round(percentile(latencies, 0.5), 4),
+        'p99 latency': round(percentile(latencies, 0.99), 4),
+        'peak rss mb': round(_get_peak_rss() / 2 ** 20, 1),
+        'cpu ms/page': round(1000 * cpu_time / pages, 3) if pages else 0,
+    })
+
+
+def _get_cpu_time() -> float:
+    '''returns cpu time of the process and its finished children'''
+    return sum(
+        usage.ru_utime + usage.ru_stime for usage in (
+            resource.getrusage(resource.RUSAGE_SELF),
+            resource.getrusage(resource.RUSAGE_CHILDREN),
+        )
+    )
+
+
+def _get_peak_rss() -> int:
+    '''returns peak resident memory in bytes of the process or its largest child'''
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # linux reports kilobytes, macos bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def main():
+    '''starts the farm and runs every mode against it'''
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - Start')
+    with open(CONF_PATH / 'benchmark.yml', 'r', encoding='utf-8') as file:
+        conf = yaml.safe_load(file)
+
+    modes = sys.argv[1:] or conf.get('modes') or list(MODES)
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        raise ValueError(f'Unknown modes {sorted(unknown)}, choose from {list(MODES)}')
+
+    settings = load_settings(CONF_PATH / 'settings.yml')
+    for name, value in (conf.get('settings') or {}).items():
+        setattr(settings, name, value)
+    # every page comes from the farm and nothing is kept between runs
+    settings.cache_path = None
+    settings.journal_path = None
+    settings.dns_cache_path = str(BENCHMARK_PATH / 'dns_cache.json')
+
+    farm_config = FarmConfig(**(conf.get('farm') or {}))
+    rows = []
+    with MockFarm(farm_config) as farm:
+        farm.seed_dns(DnsCache(
+            settings.dns_ttl, settings.dns_negative_ttl, settings.dns_cache_path))
+        for mode in modes:
+            results: Any = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=measure,
+                args=(mode, farm.site_links, farm.requests, settings, results),
+            )
+            process.start()
+            process.join()
+            if process.exitcode:
+                raise RuntimeError(f'Benchmark of {mode} failed with exit code {process.exitcode}')
+            row = results.get()
+            print(f'{datetime.now().strftime(TIME_FORMAT)} - {row}')
+            rows.append(row)
+
+    BENCHMARK_PATH.mkdir(parents=True, exist_ok=True)
+    with open(BENCHMARK_PATH / 'results.jsonl', 'a', encoding='utf-8') as file:
+        for row in rows:
+            file.write(json.dumps({
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'farm': asdict(farm_config),
+                **row,
+            }) + '\n')
+
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - End')
+
+
+if __name__ == '__main__':
+    main()
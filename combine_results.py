@@ -1,24 +1,79 @@
-from functools import reduce
+'''
+combines outputs of several runs or chunks into a single deduplicated dataset.
+Paths of the outputs can be passed as arguments, by default every output
+found in the data directory is combined
+'''
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
+from typing import List
 
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-OUTPUT_PATH = Path() / 'data'
+from multiprocessing_scrape import CONF_PATH, OUTPUT_PATH, TIME_FORMAT, load_settings
+from src.result_sink import EXCEL_SUFFIXES, deduplicate, read_table
+
+COMBINED_NAME = 'combined_sites'
+RESULT_SUFFIXES = ('.parquet', '.jsonl', '.sqlite')
+
+
+def find_outputs(path: Path) -> List[Path]:
+    '''
+    returns all outputs in the directory, oldest first
+
+    Excel files are only combined if they are legacy chunk files, other excel
+    files are exports of an output that is combined anyway. Outputs are ordered
+    by the time they were last written, so rows of a later run or of an
+    offline extraction win over rows of earlier runs.
+    '''
+    outputs = []
+    for file_path in path.iterdir():
+        if file_path.stem == COMBINED_NAME:
+            continue
+
+        if file_path.is_dir():
+            if any(file_path.glob('*.parquet')):
+                outputs.append(file_path)
+        elif file_path.suffix in RESULT_SUFFIXES or \
+                (file_path.suffix in EXCEL_SUFFIXES and 'chunk' in file_path.name):
+            outputs.append(file_path)
+
+    return sorted(outputs, key=get_modified_time)
+
+
+def get_modified_time(path: Path) -> float:
+    '''returns time of the last write to an output, of its newest part file for parquet'''
+    if path.is_dir():
+        return max(part_path.stat().st_mtime for part_path in path.glob('*.parquet'))
+
+    return path.stat().st_mtime
 
 
 def main():
-    chunks = []
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - Start')
+    settings = load_settings(CONF_PATH / 'settings.yml')
+    outputs = [Path(arg) for arg in sys.argv[1:]] or find_outputs(OUTPUT_PATH)
+    if not outputs:
+        raise ValueError(f'No outputs found in {OUTPUT_PATH}')
 
-    for file_path in OUTPUT_PATH.iterdir():
-        if file_path.is_dir() or 'chunk' not in file_path.name:
-            pass
+    # all tables share the output schema, so they are concatenated once without copies
+    with ThreadPoolExecutor() as executor:
+        tables = list(executor.map(lambda path: read_table(path, settings), outputs))
+    combined = pa.concat_tables(tables)
+    deduplicated = deduplicate(combined)
 
-        chunks.append(
-            pd.read_excel(file_path)
-        )
+    combined_path = OUTPUT_PATH / f'{COMBINED_NAME}.parquet'
+    pq.write_table(deduplicated, combined_path)
+    print(
+        f'Combined {len(combined)} rows from {len(outputs)} outputs '
+        f'into {len(deduplicated)} sites at {combined_path}')
 
-    combined_df = reduce(lambda x, y: pd.concat([x, y]), chunks)
-    combined_df.to_excel(OUTPUT_PATH / 'combined_sites.xls', index=False)
+    if settings.export_excel:
+        deduplicated.to_pandas().to_excel(
+            OUTPUT_PATH / f'{COMBINED_NAME}.xlsx', index=False, engine='xlsxwriter')
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - End')
 
 
 if __name__ == '__main__':
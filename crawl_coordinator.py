@@ -0,0 +1,84 @@
+import asyncio
+import queue
+import sys
+import time
+from datetime import datetime
+
+from multiprocessing_scrape import CONF_PATH, OUTPUT_PATH, TIME_FORMAT, load_settings
+from src.coordinator import SITE_ERROR, LeaseQueue, get_authkey, start_coordinator
+from src.crawl_journal import FAILED, CrawlJournal
+from src.dns_cache import DnsCache, preresolve
+from src.load_settings import load_sites
+from src.metrics import MetricsReporter
+from src.result_sink import export_excel, make_sink
+from src.site_record import SiteRecord
+
+# seconds the coordinator keeps serving after the last site, so idle workers learn it is over
+SHUTDOWN_GRACE = 3
+
+
+def main():
+    '''
+    coordinates a distributed crawl of all sites of the site list that are not
+    done yet. Sites are leased to the workers of crawl_worker.py, which may run
+    on other machines, and their results are written to the output here.
+    Accepts `--retry-failed` like multiprocessing_scrape.py
+    '''
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - Start')
+    settings = load_settings(CONF_PATH / 'settings.yml')
+    retry_failed = '--retry-failed' in sys.argv[1:]
+    authkey = get_authkey(settings, create=True)
+
+    with MetricsReporter(settings, merge=True), CrawlJournal(settings.journal_path) as journal:
+        journal.add_sites(load_sites(CONF_PATH / 'site_list.txt'))
+        site_links = journal.get_sites(retry_failed)
+        print(f'{len(site_links)} sites to scrape, journal: {journal.counts()}')
+
+        dns_cache = DnsCache(settings.dns_ttl, settings.dns_negative_ttl, settings.dns_cache_path)
+        dead_links = asyncio.run(preresolve(site_links, dns_cache, settings.dns_concurrency))
+        site_links = [link for link in site_links if link not in dead_links]
+        print(f'{len(dead_links)} sites with dead domains')
+
+        lease_queue = LeaseQueue(site_links, settings.lease_timeout, settings.max_lease_attempts)
+        start_coordinator(lease_queue, settings, authkey)
+        print(f'Coordinator is waiting for workers on {settings.coordinator_address}')
+
+        # sites are marked as done in the journal once their results are flushed
+        with make_sink(settings, on_flush=journal.flush) as sink:
+            for link, error in dead_links.items():
+                journal.finish_site(link, error)
+                sink.write(SiteRecord(link=link, fetch_error=error).to_dict(settings))
+
+            done = 0
+            while done < len(site_links):
+                try:
+                    link, combined_dict, error = lease_queue.results.get(timeout=1)
+                except queue.Empty:
+                    # expired leases are only noticed when the queue is asked
+                    lease_queue.is_finished()
+                    continue
+
+                done += 1
+                if combined_dict is not None:
+                    journal.finish_site(link, combined_dict['fetch error'])
+                    sink.write(combined_dict)
+                elif error == SITE_ERROR:
+                    journal.update_site(link, FAILED, error)
+                else:
+                    journal.finish_site(link, error)
+                    sink.write(SiteRecord(link=link, fetch_error=error).to_dict(settings))
+
+                if done % settings.flush_every == 0:
+                    print(f'{datetime.now().strftime(TIME_FORMAT)} - Done with {done} sites, '
+                          f'queue: {lease_queue.stats()}')
+
+        time.sleep(SHUTDOWN_GRACE)
+
+    if settings.export_excel:
+        export_excel(settings, OUTPUT_PATH / 'scraped_data.xlsx')
+
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - End')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import multiprocessing
+import os
+import sys
+from datetime import datetime
+
+from multiprocessing_scrape import CONF_PATH, TIME_FORMAT, load_settings
+from src.coordinator import get_authkey, run_worker
+
+
+def main():
+    '''
+    starts `n_workers` worker processes on this machine, each leases sites from
+    the coordinator of crawl_coordinator.py until all sites are done. The
+    address of the coordinator can be passed as an argument:
+
+        python crawl_worker.py 10.0.0.5:8950
+    '''
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - Start')
+    settings = load_settings(CONF_PATH / 'settings.yml')
+    if sys.argv[1:]:
+        settings.coordinator_address = sys.argv[1]
+    # fails before any worker starts if there is no key for the address
+    get_authkey(settings)
+
+    n_workers = settings.n_workers or os.cpu_count() or 1
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(settings, n_workers))
+        for _ in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - End')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+'''
+re-runs extraction over pages stored in the response cache without any
+network requests. Useful after changing keywords or social networks
+'''
+import os
+from datetime import datetime
+from pathlib import Path
+
+from multiprocessing_scrape import CONF_PATH, OUTPUT_PATH, TIME_FORMAT, load_settings
+from src.load_settings import load_sites
+from src.metrics import MetricsReporter
+from src.result_sink import clear_output, export_excel, make_sink
+from src.worker_pool import SitePool
+
+
+def main():
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - Start')
+    settings = load_settings(CONF_PATH / 'settings.yml')
+    if not settings.cache_path or not Path(settings.cache_path).exists():
+        raise ValueError(f'No cached pages found at {settings.cache_path}')
+
+    # parsing is cpu bound, so there is no point in more workers than cpus
+    settings.offline = True
+    settings.n_workers = settings.n_workers or os.cpu_count()
+    settings.max_workers = settings.n_workers
+    # extraction does not change the crawl state
+    settings.journal_path = None
+
+    settings.output_path = str(OUTPUT_PATH / 'extracted_data')
+    clear_output(settings)
+
+    site_links = load_sites(CONF_PATH / 'site_list.txt')
+    with MetricsReporter(settings, merge=True), make_sink(settings) as sink:
+        for _, combined_dict in SitePool(settings).imap(site_links):
+            sink.write(combined_dict)
+
+    if settings.export_excel:
+        export_excel(settings, OUTPUT_PATH / 'extracted_data.xlsx')
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - End')
+
+
+if __name__ == '__main__':
+    main()
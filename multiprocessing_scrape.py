@@ -1,17 +1,21 @@
-import multiprocessing
+import asyncio
+import sys
 from datetime import datetime
 from pathlib import Path
-from threading import BoundedSemaphore
-from typing import Dict, List
 
-import pandas as pd
 import yaml
 
+from src.crawl_journal import CrawlJournal
+from src.dns_cache import DnsCache, preresolve
 from src.load_settings import load_sites
+from src.metrics import MetricsReporter
+from src.result_sink import export_excel, make_sink
 from src.settings import Settings
-from src.site_group import SiteGroup
+from src.site_record import SiteRecord
+from src.worker_pool import SitePool
 
 CONF_PATH = Path() / 'conf'
+OUTPUT_PATH = Path() / 'data'
 TIME_FORMAT = "%H:%M:%S"
 
 
@@ -23,74 +27,48 @@ def load_settings(path: Path) -> Settings:
         return Settings(**settings)  # type: ignore
 
 
-def parse_site_group(
-    site_links: List[str],
-    settings: Settings,
-    chunkid: int
-) -> None:
-    '''function processes a group of site links. Each link is processed as a site link'''
-    print(f'{datetime.now().strftime(TIME_FORMAT)} - Starting chunk {chunkid}')
-
-    output_path = Path() / 'data' / f'scraped_data_chunk_{chunkid}.xlsx'
-    if output_path.exists():
-        print(f'{datetime.now().strftime(TIME_FORMAT)} - Done with chunk {chunkid}')
-        return None
-
-    max_threads = 30
-    thread_limiter = BoundedSemaphore(max_threads)
-    threads = []
-    for link in site_links:
-        site_group = SiteGroup(link=link, settings=settings,
-                               threadLimiter=thread_limiter)
-        site_group.start()
-        threads.append(site_group)
-
-    return_dict = {}
-    for site_group in threads:
-        site_group.join()
-        return_dict.update(
-            {
-                site_group.link: site_group.combined_dict
-            }
-        )
-
-    store_dict(return_dict, chunkid)
-    print(f'{datetime.now().strftime(TIME_FORMAT)} - Done with chunk {chunkid}')
-    # return return_dict
-
-
-def store_dict(data: Dict, idx: int) -> None:
-    '''store chunk data in an excel file'''
-    return_df = pd.DataFrame(data=data).T
-    return_df.to_excel(
-        f'data/scraped_data_chunk_{idx}.xlsx',
-        engine='xlsxwriter',
-    )
-
-
-def create_chunks(data: List, chunk_size) -> List:
-    '''split data into chunks'''
-
-    return [
-        data[i:min(i+chunk_size, len(data))]
-        for i in range(0, len(data), chunk_size)
-    ]
-
-
 def main():
+    '''
+    scrapes all sites of the site list that are not done yet. With
+    `--retry-failed` only sites that failed with a retryable error are scraped.
+    `--incremental` starts a recrawl of all sites, pages that did not change
+    since the last run are not extracted again
+    '''
     print(f'{datetime.now().strftime(TIME_FORMAT)} - Start')
-    site_links = load_sites(CONF_PATH / 'site_list.txt')
-    n_cores = 4
     settings = load_settings(CONF_PATH / 'settings.yml')
-    chunk_size = 50
-
-    chunks = create_chunks(site_links, chunk_size)
-
-    pool = multiprocessing.Pool(n_cores)
-    pool.starmap(
-        parse_site_group,
-        [(chunk, settings, idx) for idx, chunk in enumerate(chunks)]
-    )
+    retry_failed = '--retry-failed' in sys.argv[1:]
+    incremental = '--incremental' in sys.argv[1:]
+
+    # metrics of all worker processes are merged by the reporter of the main process
+    with MetricsReporter(settings, merge=True), CrawlJournal(settings.journal_path) as journal:
+        journal.add_sites(load_sites(CONF_PATH / 'site_list.txt'))
+        if incremental:
+            journal.restart_sites()
+        site_links = journal.get_sites(retry_failed)
+        print(f'{len(site_links)} sites to scrape, journal: {journal.counts()}')
+
+        # hosts are resolved before any worker starts, workers read the saved cache
+        dns_cache = DnsCache(settings.dns_ttl, settings.dns_negative_ttl, settings.dns_cache_path)
+        dead_links = asyncio.run(preresolve(site_links, dns_cache, settings.dns_concurrency))
+        site_links = [link for link in site_links if link not in dead_links]
+        print(f'{len(dead_links)} sites with dead domains')
+
+        # results stream back as soon as a site is done and are appended to the output,
+        # sites are marked as done in the journal once their results are flushed
+        with make_sink(settings, on_flush=journal.flush) as sink:
+            for link, error in dead_links.items():
+                journal.finish_site(link, error)
+                sink.write(SiteRecord(link=link, fetch_error=error).to_dict(settings))
+            for idx, (link, combined_dict) in enumerate(SitePool(settings).imap(site_links)):
+                journal.finish_site(link, combined_dict['fetch error'])
+                sink.write(combined_dict)
+                if (idx + 1) % settings.flush_every == 0:
+                    print(f'{datetime.now().strftime(TIME_FORMAT)} - Done with {idx + 1} sites')
+
+    if settings.export_excel:
+        export_excel(settings, OUTPUT_PATH / 'scraped_data.xlsx')
+
+    print(f'{datetime.now().strftime(TIME_FORMAT)} - End')
 
 
 if __name__ == '__main__':
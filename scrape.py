@@ -1,17 +1,23 @@
 '''main scraping script'''
 import asyncio
+import sys
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
-from threading import BoundedSemaphore
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
-import pandas as pd
 import yaml
 from tqdm import tqdm
 
+from src.crawl_journal import CrawlJournal
+from src.dns_cache import preresolve
+from src.fetch_engine import FetchEngine
 from src.load_settings import load_sites
+from src.metrics import MetricsReporter, profiled
+from src.result_sink import ResultSink, export_excel, make_sink
 from src.settings import Settings
-from src.site_group import SiteGroup
+from src.site_record import SiteRecord
+from src.worker_pool import scrape_site
 
 CONF_PATH = Path() / 'conf'
 TIME_FORMAT = "%H:%M:%S"
@@ -45,27 +51,34 @@ def load_settings(path: Path) -> Settings:
 async def parse_site_groups(
     site_links: List[str],
     settings: Settings,
-    chunkid: int
+    chunkid: int,
+    engine: FetchEngine,
+    sink: Optional[ResultSink] = None,
+    journal: Optional[CrawlJournal] = None,
 ) -> Dict:
-    '''function processes a group of site links. Each link is processed as a site link'''
+    '''
+    function processes a group of site links. Each link is processed as a site link
+    if a sink is given, every site is written to it as soon as it is done
+    if a journal is given, state of every site and page is recorded in it
+    sites that raised an error are marked as failed and left out of the result
+    '''
     print(f'{datetime.now().strftime(TIME_FORMAT)} - Starting chunk {chunkid}')
-    max_threads = 20
-    thread_limiter = BoundedSemaphore(max_threads)
-    threads = []
-    for link in site_links:
-        site_group = SiteGroup(link=link, settings=settings,
-                               threadLimiter=thread_limiter)
-        site_group.start()
-        threads.append(site_group)
+
+    async def run_site_group(link: str) -> Tuple[str, Any]:
+        link, combined_dict = await scrape_site(link, settings, engine, journal)
+        if combined_dict is not None:
+            if journal:
+                journal.finish_site(link, combined_dict['fetch error'])
+            if sink:
+                sink.write(combined_dict)
+        return link, combined_dict
+
+    results = await asyncio.gather(*(run_site_group(link) for link in site_links))
 
     return_dict = {}
-    for site_group in threads:
-        site_group.join()
-        return_dict.update(
-            {
-                site_group.link: site_group.combined_dict
-            }
-        )
+    for link, combined_dict in results:
+        if combined_dict is not None:
+            return_dict.update({link: combined_dict})
 
     print(f'{datetime.now().strftime(TIME_FORMAT)} - Done with chunk {chunkid}')
     return return_dict
@@ -79,38 +92,48 @@ async def main():
     #               'https://enabled4life.com.au/']
     # site_links = ['https://enabled4life.com.au/',
     #               'https://acerehabsolutions.com/']
-    site_links = load_sites(CONF_PATH / 'site_list.txt')[:500]
     settings = load_settings(CONF_PATH / 'settings.yml')
-
-    chunk_size = 20
-    chunks = [
-        site_links[i:min(i+chunk_size, len(site_links))]
-        for i in range(0, len(site_links), chunk_size)
-    ]
-
-    # start a separate task for each task
-    tasks = []
-    for idx, chunk in enumerate(tqdm(chunks, 'creating tasks')):
-        tasks.append(
-            asyncio.create_task(
-                parse_site_groups(chunk, settings, idx)
-            )
-        )
-
-    # wait for all tasks to complete
-    await asyncio.gather(*tasks)
-
-    # combine all results
-    site_dict = {}
-    for task in tasks:
-        site_dict.update(task.result())
-
-    return_df = pd.DataFrame(data=site_dict).T
-    print(return_df.head())
-    return_df.to_excel(
-        'data/scraped_data.xlsx',
-        engine='xlsxwriter',
-    )
+    with MetricsReporter(settings, merge=True), profiled(settings):
+        site_links = load_sites(CONF_PATH / 'site_list.txt')[:500]
+        journal = CrawlJournal(settings.journal_path) if settings.journal_path else None
+        if journal:
+            journal.add_sites(site_links)
+            # resume sites that are not done yet, or re-run only the failed ones
+            site_links = journal.get_sites(retry_failed='--retry-failed' in sys.argv[1:])
+
+        chunk_size = 20
+
+        # start a separate task for each task, all of them share one engine and one sink
+        async with FetchEngine(settings) as engine:
+            with journal or nullcontext(), \
+                    make_sink(settings, on_flush=journal.flush if journal else None) as sink:
+                # sites of dead domains fail before any request slot is spent on them
+                dead_links = await preresolve(
+                    site_links, engine.dns_cache, settings.dns_concurrency)
+                for link, error in dead_links.items():
+                    if journal:
+                        journal.finish_site(link, error)
+                    sink.write(SiteRecord(link=link, fetch_error=error).to_dict(settings))
+                site_links = [link for link in site_links if link not in dead_links]
+
+                chunks = [
+                    site_links[i:min(i+chunk_size, len(site_links))]
+                    for i in range(0, len(site_links), chunk_size)
+                ]
+                tasks = []
+                for idx, chunk in enumerate(tqdm(chunks, 'creating tasks')):
+                    tasks.append(
+                        asyncio.create_task(
+                            parse_site_groups(chunk, settings, idx, engine, sink, journal)
+                        )
+                    )
+
+                # wait for all tasks to complete
+                await asyncio.gather(*tasks)
+            print(f'scheduler: {engine.scheduler.stats()}')
+
+    if settings.export_excel:
+        export_excel(settings, 'data/scraped_data.xlsx')
     print(f'{datetime.now().strftime(TIME_FORMAT)} - End')
 
 
@@ -0,0 +1,316 @@
+'''
+coordinator hands out sites to worker nodes on other machines in leases and
+collects their results, so a crawl is not limited to the cores of one machine
+'''
+
+import asyncio
+import collections
+import ipaddress
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from src.crawl_journal import CrawlJournal
+from src.fetch_engine import FetchEngine
+from src.metrics import METRICS, MetricsReporter, profiled
+from src.settings import Settings
+from src.worker_pool import scrape_site
+
+# error of sites whose leases expired too many times
+LEASE_ERROR = 'lease expired'
+# error of sites that raised on every attempt
+SITE_ERROR = 'error'
+# environment variable with the key coordinator and workers authenticate with
+AUTHKEY_ENV = 'COORDINATOR_AUTHKEY'
+# key created by a coordinator on a loopback address without a configured key
+LOCAL_AUTHKEY_PATH = Path('data') / 'coordinator.key'
+
+
+class Lease():
+    '''class stores sites leased to a worker and the time the lease expires'''
+
+    def __init__(self, worker: str, links: List[str], expires: float) -> None:
+        self.worker = worker
+        self.links = set(links)
+        self.expires = expires
+
+
+class LeaseQueue():
+    '''
+    class owns the frontier of sites of a distributed crawl
+
+    Workers lease batches of sites and submit the result of every site as soon
+    as it is done. A lease expires after `lease_timeout` seconds unless its
+    worker renews it, so sites of a worker that died go back to the frontier.
+    Sites a worker could not scrape go back to the frontier as well. A site
+    is given up after `max_attempts` leases, with a `lease expired` error or
+    the `error` of a failed scrape. Results of an expired lease are refused,
+    its sites may already belong to another worker. Results arrive through
+    `results` as link, combined dictionary and error, where the coordinator
+    picks them up. Methods are called from the threads of the manager server,
+    so they hold a lock.
+    '''
+
+    def __init__(self, links: List[str], lease_timeout: float, max_attempts: int) -> None:
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.results: queue.Queue = queue.Queue()
+        self._pending: Deque[str] = collections.deque(dict.fromkeys(links))
+        self._leases: Dict[str, Lease] = {}
+        self._attempts: Dict[str, int] = collections.Counter()
+        self._done: Set[str] = set()
+        self._total = len(self._pending)
+        self._lock = threading.Lock()
+
+    def lease(self, worker: str, size: int) -> Tuple[Optional[str], List[str]]:
+        '''
+        leases up to `size` pending sites to the worker, returns id of the lease
+        and its sites. Without pending sites the id is None and there are none
+        '''
+        with self._lock:
+            self._expire()
+            links = []
+            while self._pending and len(links) < size:
+                link = self._pending.popleft()
+                if link not in self._done:
+                    links.append(link)
+            if not links:
+                return None, []
+
+            lease_id = uuid.uuid4().hex
+            self._leases[lease_id] = Lease(worker, links, time.monotonic() + self.lease_timeout)
+            for link in links:
+                self._attempts[link] += 1
+            return lease_id, links
+
+    def renew(self, lease_id: str) -> bool:
+        '''extends the lease, returns False if it already expired'''
+        with self._lock:
+            self._expire()
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                return False
+            lease.expires = time.monotonic() + self.lease_timeout
+            return True
+
+    def submit(self, lease_id: str, link: str, combined_dict: Optional[Dict]) -> bool:
+        '''
+        takes the result of a leased site, None if the worker could not scrape it
+        returns False if the lease expired, the result is dropped then
+        '''
+        with self._lock:
+            self._expire()
+            lease = self._leases.get(lease_id)
+            if lease is None or link not in lease.links:
+                return False
+
+            lease.links.discard(link)
+            if not lease.links:
+                del self._leases[lease_id]
+            if combined_dict is None and self._attempts[link] < self.max_attempts:
+                self._pending.append(link)
+                return True
+            self._done.add(link)
+
+        self.results.put((link, combined_dict, None if combined_dict else SITE_ERROR))
+        return True
+
+    def is_finished(self) -> bool:
+        '''whether every site is done'''
+        with self._lock:
+            self._expire()
+            return len(self._done) >= self._total
+
+    def stats(self) -> Dict[str, int]:
+        '''returns number of sites in each state'''
+        with self._lock:
+            return {
+                'total': self._total,
+                'pending': len(self._pending),
+                'leased': sum(len(lease.links) for lease in self._leases.values()),
+                'leases': len(self._leases),
+                'done': len(self._done),
+            }
+
+    def _expire(self) -> None:
+        '''returns sites of expired leases to the frontier'''
+        now = time.monotonic()
+        for lease_id, lease in list(self._leases.items()):
+            if lease.expires > now:
+                continue
+            del self._leases[lease_id]
+            for link in lease.links - self._done:
+                if self._attempts[link] >= self.max_attempts:
+                    self._done.add(link)
+                    self.results.put((link, None, LEASE_ERROR))
+                else:
+                    self._pending.append(link)
+
+
+class CoordinatorManager(BaseManager):
+    '''manager sharing the lease queue of the coordinator over tcp'''
+
+
+class WorkerManager(BaseManager):
+    '''
+    manager connecting a worker to the lease queue of the coordinator, its own
+    class so registering the proxy never touches the registry of a coordinator
+    '''
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    '''splits `host:port` of the coordinator'''
+    host, _, port = address.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+def is_loopback(host: str) -> bool:
+    '''whether the host only accepts connections of the same machine'''
+    if host == 'localhost':
+        return True
+
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def get_authkey(settings: Settings, create: bool = False) -> bytes:
+    '''
+    returns the key coordinator and workers authenticate each other with
+
+    The manager unpickles what it receives, so whoever knows the key can run
+    code on the coordinator and on the workers. The key is read from the
+    `COORDINATOR_AUTHKEY` environment variable or `coordinator_authkey`, and
+    is required unless the coordinator listens on a loopback address. There a
+    coordinator without a key creates a random one in `LOCAL_AUTHKEY_PATH`,
+    readable only by its user, and workers of the machine read it from there.
+
+    Args:
+        create: whether to create a new local key, done by the coordinator
+    '''
+    key = os.environ.get(AUTHKEY_ENV) or settings.coordinator_authkey
+    if key:
+        return key.encode('utf-8')
+
+    host, _ = parse_address(settings.coordinator_address)
+    if not is_loopback(host):
+        raise ValueError(
+            f'Coordinator address {settings.coordinator_address} is reachable from other '
+            f'machines, set {AUTHKEY_ENV} or coordinator_authkey on every node')
+
+    if create:
+        LOCAL_AUTHKEY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        descriptor = os.open(LOCAL_AUTHKEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(LOCAL_AUTHKEY_PATH, 0o600)
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            file.write(secrets.token_hex(32))
+
+    try:
+        return LOCAL_AUTHKEY_PATH.read_text(encoding='utf-8').strip().encode('utf-8')
+    except OSError as err:
+        raise ValueError(
+            f'No key of a local coordinator in {LOCAL_AUTHKEY_PATH}, start the '
+            f'coordinator first or set {AUTHKEY_ENV}') from err
+
+
+def start_coordinator(
+    lease_queue: LeaseQueue,
+    settings: Settings,
+    authkey: bytes,
+) -> threading.Thread:
+    '''serves the lease queue to the workers from a background thread'''
+    CoordinatorManager.register('get_queue', callable=lambda: lease_queue)
+    manager = CoordinatorManager(
+        address=parse_address(settings.coordinator_address),
+        authkey=authkey,
+    )
+    server = manager.get_server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def connect(settings: Settings) -> Any:
+    '''returns proxy of the lease queue of the coordinator'''
+    WorkerManager.register('get_queue')
+    manager = WorkerManager(
+        address=parse_address(settings.coordinator_address),
+        authkey=get_authkey(settings),
+    )
+    manager.connect()
+    return manager.get_queue()
+
+
+async def _work(settings: Settings, n_processes: int) -> None:
+    '''
+    leases sites from the coordinator until all sites are done
+
+    Sites of a lease are scraped concurrently and every result is submitted
+    as soon as it is ready, the lease is renewed in the background meanwhile.
+    If the lease could not be renewed, its sites are cancelled, they may
+    already belong to another worker. Sites and pages are recorded in the
+    journal at `journal_path` of the node, shared with the coordinator if it
+    runs on the same machine. Calls to the coordinator block, so they run in
+    the default executor.
+    '''
+    loop = asyncio.get_running_loop()
+    lease_queue = connect(settings)
+    worker = f'{socket.gethostname()}-{os.getpid()}'
+
+    async def call(method: str, *args) -> Any:
+        return await loop.run_in_executor(None, getattr(lease_queue, method), *args)
+
+    async def renew(lease_id: str, tasks: List[asyncio.Task]) -> None:
+        while True:
+            await asyncio.sleep(settings.lease_timeout / 3)
+            if not await call('renew', lease_id):
+                print(f'Worker {worker} lost lease {lease_id}, dropping its sites')
+                for task in tasks:
+                    task.cancel()
+                return
+
+    async def run_site(lease_id: str, link: str) -> None:
+        _, combined_dict = await scrape_site(link, settings, engine, journal)
+        await call('submit', lease_id, link, combined_dict)
+
+    journal_context = CrawlJournal(settings.journal_path) if settings.journal_path \
+        else nullcontext()
+    async with FetchEngine(settings, n_processes) as engine:
+        with journal_context as journal:
+            while True:
+                lease_id, links = await call('lease', worker, settings.lease_size)
+                if not links:
+                    if await call('is_finished'):
+                        break
+                    # other workers still hold leases that may expire
+                    await asyncio.sleep(1)
+                    continue
+
+                tasks = [asyncio.create_task(run_site(lease_id, link)) for link in links]
+                renew_task = asyncio.create_task(renew(lease_id, tasks))
+                try:
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                finally:
+                    renew_task.cancel()
+
+        print(f'Worker {worker} is done, scheduler: {engine.scheduler.stats()}')
+
+
+def run_worker(settings: Settings, n_processes: int) -> None:
+    '''entry point of a worker process of a node'''
+    METRICS.clear()
+    with MetricsReporter(settings), profiled(settings):
+        try:
+            asyncio.run(_work(settings, n_processes))
+        except (EOFError, ConnectionError) as err:
+            # the coordinator stops serving once all sites are done
+            print(f'Worker {os.getpid()} lost the coordinator: {err}')
@@ -0,0 +1,262 @@
+'''
+crawl journal records the state of every site and page in a sqlite database,
+so an interrupted crawl resumes where it stopped and failures can be re-run.
+It also keeps the last version of every page, so a recrawl only extracts
+pages that changed
+'''
+
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from src.http_cache import conditional_headers
+
+PENDING = 'pending'
+IN_FLIGHT = 'in flight'
+DONE = 'done'
+FAILED = 'failed'
+STATES = (PENDING, IN_FLIGHT, DONE, FAILED)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sites (
+    link TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    reason TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL,
+    reason TEXT,
+    retryable INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    PRIMARY KEY (site, url)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT NOT NULL,
+    settings_key TEXT NOT NULL,
+    status INTEGER,
+    record TEXT NOT NULL,
+    self_links TEXT NOT NULL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS sites_state ON sites (state);
+CREATE INDEX IF NOT EXISTS pages_state ON pages (state);
+'''
+UPSERT_SITE = '''
+INSERT INTO sites (link, state, reason, attempts, updated_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (link) DO UPDATE SET
+    state = excluded.state,
+    reason = excluded.reason,
+    attempts = attempts + excluded.attempts,
+    updated_at = excluded.updated_at
+'''
+UPSERT_PAGE = '''
+INSERT INTO pages (site, url, state, reason, retryable, attempts, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (site, url) DO UPDATE SET
+    state = excluded.state,
+    reason = excluded.reason,
+    retryable = excluded.retryable,
+    attempts = attempts + excluded.attempts,
+    updated_at = excluded.updated_at
+'''
+VERSION_COLUMNS = (
+    'url', 'etag', 'last_modified', 'content_hash', 'settings_key', 'status', 'record',
+    'self_links',
+)
+UPSERT_VERSION = f'''
+INSERT OR REPLACE INTO versions ({', '.join(VERSION_COLUMNS)}, updated_at)
+VALUES ({', '.join('?' * (len(VERSION_COLUMNS) + 1))})
+'''
+
+
+@dataclass
+class PageVersion():
+    '''
+    class stores what the last run learned about a page: its validators, hash
+    of its content and the dictionary extracted from it
+    '''
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    settings_key: str
+    status: Optional[int]
+    record: Dict[str, Any] = field(default_factory=dict)
+    self_links: List[str] = field(default_factory=list)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        '''headers that let the server answer with 304 if nothing changed'''
+        return conditional_headers(self.etag, self.last_modified)
+
+
+class CrawlJournal():
+    '''
+    class stores state of sites and their pages: pending, in flight, done or
+    failed with a reason
+
+    Every process opens its own journal on the same file. Workers record sites
+    and pages they start and finish right away. The main process records
+    finished sites with `finish_site`, these updates are only written on `flush`,
+    which is called after the results are flushed to the output. So a site is
+    never marked as done before its result is stored. Sites left in flight by an
+    interrupted run are picked up again on resume.
+
+    Pages are versioned by url. Workers store a version of every page they
+    extract, `restart_sites` starts a recrawl that can reuse these versions.
+    '''
+
+    def __init__(self, path: Union[str, Path], timeout: float = 60) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=timeout)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        self._connection.executescript(SCHEMA)
+        page_columns = [row[1] for row in self._connection.execute('PRAGMA table_info(pages)')]
+        if 'retryable' not in page_columns:
+            # journals of earlier versions
+            self._connection.execute(
+                'ALTER TABLE pages ADD COLUMN retryable INTEGER NOT NULL DEFAULT 0')
+        self._finished: List[Tuple] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def add_sites(self, links: Iterable[str]) -> None:
+        '''adds sites as pending, sites already in the journal keep their state'''
+        now = time.time()
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO sites (link, state, updated_at) VALUES (?, ?, ?)',
+                ((link, PENDING, now) for link in links),
+            )
+
+    def restart_sites(self) -> None:
+        '''marks every site as pending again, to recrawl the whole site list'''
+        with self._connection:
+            self._connection.execute(
+                'UPDATE sites SET state = ?, reason = NULL, updated_at = ?',
+                (PENDING, time.time()),
+            )
+
+    def get_sites(self, retry_failed: bool = False) -> List[str]:
+        '''
+        returns sites to be scraped
+
+        Args:
+            retry_failed: return only sites with pages that failed with a
+                retryable error (timeout, connection, 429 / 5xx) instead of
+                sites that are pending or were left in flight. A failed site
+                whose main page failed with an error that would not go away,
+                like a 404 or robots.txt, is left out. Failed sites without a
+                recorded main page (dead domain, raised error) are returned
+        '''
+        if retry_failed:
+            query = '''
+                SELECT link FROM sites WHERE state = ? AND NOT EXISTS (
+                    SELECT 1 FROM pages
+                    WHERE site = sites.link AND url = sites.link AND state = ? AND NOT retryable
+                )
+                UNION SELECT site FROM pages WHERE state = ? AND retryable
+            '''
+            params: Tuple = (FAILED, FAILED, FAILED)
+        else:
+            query = 'SELECT link FROM sites WHERE state IN (?, ?) ORDER BY rowid'
+            params = (PENDING, IN_FLIGHT)
+
+        return [row[0] for row in self._connection.execute(query, params)]
+
+    def update_site(self, link: str, state: str, reason: Optional[str] = None) -> None:
+        '''
+        records the state of a site right away, a site starting again in
+        flight drops the pages of its previous run
+        '''
+        with self._connection:
+            if state == IN_FLIGHT:
+                self._connection.execute('DELETE FROM pages WHERE site = ?', (link,))
+            self._connection.execute(
+                UPSERT_SITE, (link, state, reason, int(state == IN_FLIGHT), time.time()))
+
+    def update_page(
+        self,
+        site: str,
+        url: str,
+        state: str,
+        reason: Optional[str] = None,
+        retryable: bool = False,
+    ) -> None:
+        '''
+        records the state of a single page of a site right away, `retryable`
+        marks failures worth another try with `--retry-failed`
+        '''
+        with self._connection:
+            self._connection.execute(UPSERT_PAGE, (
+                site, url, state, reason, int(retryable), int(state == IN_FLIGHT), time.time()))
+
+    def get_version(self, url: str, settings_key: str) -> Optional[PageVersion]:
+        '''
+        returns last version of the page, None if there is none or if it was
+        extracted with other settings
+        '''
+        row = self._connection.execute(
+            f'SELECT {", ".join(VERSION_COLUMNS)} FROM versions WHERE url = ?', (url,)
+        ).fetchone()
+        if not row:
+            return None
+
+        version = dict(zip(VERSION_COLUMNS, row))
+        if version['settings_key'] != settings_key:
+            return None
+
+        version['record'] = json.loads(version['record'])
+        version['self_links'] = json.loads(version['self_links'])
+        return PageVersion(**version)
+
+    def put_version(self, version: PageVersion) -> None:
+        '''stores version of a page right away, replacing the previous one'''
+        with self._connection:
+            self._connection.execute(UPSERT_VERSION, (
+                version.url, version.etag, version.last_modified, version.content_hash,
+                version.settings_key, version.status, json.dumps(version.record),
+                json.dumps(version.self_links), time.time(),
+            ))
+
+    def finish_site(self, link: str, reason: Optional[str] = None) -> None:
+        '''marks site as done, or failed if there is a reason, on the next flush'''
+        self._finished.append(
+            (link, FAILED if reason else DONE, reason, 0, time.time()))
+
+    def flush(self) -> None:
+        '''writes sites finished since the last flush'''
+        if not self._finished:
+            return
+
+        with self._connection:
+            self._connection.executemany(UPSERT_SITE, self._finished)
+        self._finished = []
+
+    def counts(self) -> Dict[str, int]:
+        '''returns number of sites in each state'''
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self._connection.execute(
+            'SELECT state, COUNT(*) FROM sites GROUP BY state'))
+        return counts
+
+    def close(self) -> None:
+        '''flushes finished sites and closes the journal'''
+        self.flush()
+        self._connection.close()
@@ -0,0 +1,205 @@
+'''
+dns cache shared by the fetch layer of all worker processes. Host names of
+the site list are resolved once at start-up, dead domains are known before
+any request is made
+'''
+
+import asyncio
+import json
+import socket
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from urllib.parse import urlsplit
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import ThreadedResolver
+
+from src.file_utils import write_atomic
+
+
+# resolver errors telling that the domain does not exist, other errors may be temporary
+DEAD_DOMAIN_ERRORS = tuple(
+    getattr(socket, name) for name in ('EAI_NONAME', 'EAI_NODATA') if hasattr(socket, name)
+)
+
+
+class DnsCache():
+    '''
+    class stores resolved addresses and dead domains with an expiry time
+
+    The cache can be saved to and loaded from a json file, so hosts resolved
+    by the main process at start-up are known to every worker process.
+
+    Args:
+        ttl: seconds resolved addresses are kept
+        negative_ttl: seconds dead domains are kept
+        path: json file of the cache, the cache lives in memory if not given
+    '''
+
+    def __init__(
+        self,
+        ttl: float,
+        negative_ttl: float,
+        path: Union[str, Path, Any] = None,
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = Path(path) if path else None
+        # host -> (expiry time, addresses as returned by the resolver)
+        self._addresses: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        # host -> (expiry time, error)
+        self._dead: Dict[str, Tuple[float, str]] = {}
+        if self.path and self.path.exists():
+            self.load()
+
+    def get(self, host: str) -> Optional[List[Dict[str, Any]]]:
+        '''returns cached addresses of the host, None if unknown or expired'''
+        expires, addresses = self._addresses.get(host, (0, []))
+        if expires < time.time():
+            return None
+
+        return addresses
+
+    def get_error(self, host: str) -> Optional[str]:
+        '''returns resolver error of the host if it is a known dead domain'''
+        expires, error = self._dead.get(host, (0, ''))
+        if expires < time.time():
+            return None
+
+        return error
+
+    def put(self, host: str, addresses: List[Dict[str, Any]]) -> None:
+        '''stores addresses of the host'''
+        self._addresses[host] = (time.time() + self.ttl, addresses)
+        self._dead.pop(host, None)
+
+    def put_dead(self, host: str, error: str) -> None:
+        '''stores the host as a dead domain'''
+        self._dead[host] = (time.time() + self.negative_ttl, error)
+
+    def load(self) -> None:
+        '''reads entries of the json file that did not expire yet'''
+        with open(self.path, 'r', encoding='utf-8') as file:  # type: ignore
+            data = json.load(file)
+
+        now = time.time()
+        self._addresses.update({
+            host: (expires, addresses)
+            for host, (expires, addresses) in data.get('addresses', {}).items()
+            if expires > now
+        })
+        self._dead.update({
+            host: (expires, error)
+            for host, (expires, error) in data.get('dead', {}).items()
+            if expires > now
+        })
+
+    def save(self) -> None:
+        '''writes the cache to its json file atomically'''
+        if not self.path:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, json.dumps({'addresses': self._addresses, 'dead': self._dead}))
+
+
+class CachingResolver(AbstractResolver):
+    '''
+    aiohttp resolver answering from the dns cache, only cache misses go to the
+    system resolver. Dead domains fail right away
+    '''
+
+    def __init__(self, cache: DnsCache) -> None:
+        self.cache = cache
+        self._resolver = ThreadedResolver()
+
+    async def resolve(
+        self,
+        host: str,
+        port: int = 0,
+        family: int = socket.AF_INET,
+    ) -> List[Dict[str, Any]]:
+        host = host.lower()
+        addresses = self.cache.get(host)
+        if addresses is None and not self.cache.get_error(host):
+            addresses = await resolve_host(self._resolver, host, self.cache, family)
+
+        if addresses is None:
+            # raised as a resolver error, so the fetch layer classifies it as a dns failure
+            raise socket.gaierror(socket.EAI_NONAME, f'{host} is a dead domain')
+
+        return [{**address, 'hostname': host, 'port': port} for address in addresses]
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+
+def get_hostname(url: str) -> str:
+    '''returns host name of the url as the resolver sees it'''
+    try:
+        return (urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ''
+
+
+async def resolve_host(
+    resolver: AbstractResolver,
+    host: str,
+    cache: DnsCache,
+    family: int = socket.AF_UNSPEC,
+) -> Optional[List[Dict[str, Any]]]:
+    '''
+    resolves the host and stores the outcome in the cache, returns None for a
+    dead domain. Temporary resolver errors are raised and not cached
+    '''
+    try:
+        addresses = await resolver.resolve(host, 0, family)
+    except socket.gaierror as err:
+        if err.errno not in DEAD_DOMAIN_ERRORS:
+            raise
+        cache.put_dead(host, 'dns')
+        return None
+
+    addresses = [dict(address) for address in addresses]
+    cache.put(host, addresses)
+    return addresses
+
+
+async def preresolve(
+    links: Iterable[str],
+    cache: DnsCache,
+    concurrency: int,
+) -> Dict[str, str]:
+    '''
+    resolves hosts of all links concurrently and saves the cache
+
+    Returns:
+        links whose domain is dead, with the resolver error
+    '''
+    resolver = ThreadedResolver()
+    limiter = asyncio.Semaphore(concurrency)
+    links = list(links)
+    hosts = {get_hostname(link) for link in links} - {''}
+
+    async def resolve(host: str) -> None:
+        if cache.get(host) is not None or cache.get_error(host):
+            return
+        async with limiter:
+            try:
+                await resolve_host(resolver, host, cache)
+            except OSError:
+                pass
+
+    await asyncio.gather(*(resolve(host) for host in hosts))
+    await resolver.close()
+    cache.save()
+
+    dead_links = {}
+    for link in links:
+        error = cache.get_error(get_hostname(link))
+        if error:
+            dead_links[link] = error
+
+    return dead_links
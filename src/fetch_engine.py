@@ -0,0 +1,223 @@
+'''
+fetch engine is an asyncio based http client shared by all
+sites and site groups processed inside a single worker process
+'''
+
+import asyncio
+import random
+from typing import Any, Dict, Optional, Union
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from src.dns_cache import CachingResolver, DnsCache, get_hostname
+from src.http_cache import ResponseCache
+from src.politeness import parse_robots
+from src.request_utils import FetchResult, create_session, get_page_content
+from src.scheduler import FetchScheduler
+from src.settings import Settings
+from src.url_utils import UrlFrontier
+
+
+class FetchEngine():
+    '''
+    class owns the http session and concurrency limits of one event loop
+
+    Each worker process holds a single engine, so all site groups processed by
+    the worker share one connection pool, one fetch scheduler and one frontier
+    of pages seen during the run.
+    '''
+    settings: Settings
+    scheduler: FetchScheduler
+    cache: Optional[ResponseCache]
+    dns_cache: DnsCache
+    frontier: UrlFrontier
+
+    def __init__(self, settings: Settings, n_processes: int = 1) -> None:
+        self.settings = settings
+        self.scheduler = FetchScheduler(settings, n_processes)
+        self.frontier = UrlFrontier()
+        self.dns_cache = DnsCache(
+            settings.dns_ttl, settings.dns_negative_ttl, settings.dns_cache_path)
+        self.cache = None
+        if settings.cache_path:
+            self.cache = ResponseCache(
+                settings.cache_path,
+                ttl=settings.cache_ttl,
+                max_size=settings.cache_max_size_mb * 2 ** 20,
+            )
+        self._session: Union[aiohttp.ClientSession, Any] = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        '''creates the http session inside of the running event loop'''
+        if self._session or self.settings.offline:
+            return
+
+        self._session = create_session(self.settings, CachingResolver(self.dns_cache))
+
+    async def close(self) -> None:
+        '''closes the http session and all open connections'''
+        if not self._session:
+            return
+
+        await self._session.close()
+        self._session = None
+
+    async def get_page_content(
+        self,
+        url: str,
+        deadline: Optional[float] = None,
+        check_robots: bool = True,
+        validators: Optional[Dict[str, str]] = None,
+    ) -> FetchResult:
+        '''
+        fetches page content respecting global and per host limits
+
+        Fresh pages are read from the response cache. Stale cached pages are
+        revalidated with a conditional request and reused if the server answers
+        with 304. Pages that are not cached are requested with `validators`,
+        conditional headers of an earlier version of the page, if there are
+        any. Such a page unchanged since then comes back as a 304 without
+        content. Pages of dead domains and pages disallowed by the robots.txt of
+        their host are not requested. Retryable failures are retried with jittered exponential
+        backoff, limiter slots are released while waiting between attempts.
+        In offline mode pages are only read from the cache, whatever their age.
+
+        Args:
+            url: link of the page to be fetched
+            deadline: event loop time after which no further attempts are made
+            check_robots: whether to check robots.txt rules of the host
+            validators: conditional headers used when the page is not cached
+
+        Returns:
+            result of the last attempt
+        '''
+        entry = self.cache.get(url) if self.cache else None
+        if self.settings.offline and not entry:
+            return FetchResult(url=url, error='not cached', attempts=0)
+
+        if entry and (self.settings.offline or entry.is_fresh(self.settings.cache_ttl)):
+            return FetchResult(
+                url=url,
+                content=entry.content,
+                status=entry.status,
+                headers=entry.headers,
+                attempts=0,
+                cache='hit',
+            )
+
+        dns_error = self.dns_cache.get_error(get_hostname(url))
+        if dns_error:
+            return FetchResult(url=url, error=dns_error, attempts=0)
+
+        await self.start()
+        if check_robots and self.settings.respect_robots and \
+                not await self._is_allowed(url, deadline):
+            return FetchResult(url=url, error='robots', attempts=0)
+
+        header = self.settings.header
+        if entry:
+            header = {**header, **entry.conditional_headers()}
+        elif validators:
+            header = {**header, **validators}
+
+        result = await self._fetch(url, header, deadline)
+        if entry and result.status == 304:
+            self.cache.touch(entry)  # type: ignore
+            result.content = entry.content
+            result.status = entry.status
+            result.headers = entry.headers
+            result.cache = 'revalidated'
+        elif validators and result.status == 304:
+            result.cache = 'not modified'
+        elif self.cache and result.content is not None:
+            self.cache.put(url, result.status, result.headers, result.content)  # type: ignore
+
+        return result
+
+    async def _fetch(self, url: str, header: Dict, deadline: Optional[float]) -> FetchResult:
+        '''requests the page, retrying failures that are worth retrying'''
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.settings.max_retries + 1):
+            async with self.scheduler.slot(url):
+                # the slot may have waited for the host, so the budget is checked afterwards
+                timeout = self._get_timeout(deadline)
+                if not timeout:
+                    return FetchResult(url=url, error='deadline', attempts=attempt)
+
+                result = await get_page_content(
+                    self._session, url, header, timeout,
+                    max_size=int(self.settings.max_body_size_mb * 2 ** 20),
+                    content_types=self.settings.content_types,
+                )
+            result.attempts = attempt + 1
+            self.scheduler.report(url, result.status, result.headers.get('Retry-After'))
+
+            if not result.retryable or attempt == self.settings.max_retries:
+                return result
+
+            backoff = random.uniform(0, min(
+                self.settings.retry_backoff_max,
+                self.settings.retry_backoff * 2 ** attempt,
+            ))
+            if deadline is not None and loop.time() + backoff >= deadline:
+                return result
+            await asyncio.sleep(backoff)
+
+        return result
+
+    def is_allowed(self, url: str) -> bool:
+        '''
+        checks robots.txt rules without fetching anything, pages of hosts whose
+        robots.txt was not fetched yet are allowed
+        '''
+        if not self.settings.respect_robots or self.settings.offline:
+            return True
+
+        robots = self.scheduler.get_policy(url).robots
+        return robots is None or robots.can_fetch(self._user_agent, url)
+
+    async def _is_allowed(self, url: str, deadline: Optional[float]) -> bool:
+        '''
+        checks robots.txt rules of the url host, the file is fetched once per host
+        and its Crawl-delay is passed to the host policy of the scheduler
+        '''
+        policy = self.scheduler.get_policy(url)
+        async with policy.robots_lock:
+            if policy.robots is None:
+                parts = urlsplit(url)
+                result = await self.get_page_content(
+                    f'{parts.scheme}://{parts.netloc}/robots.txt', deadline, check_robots=False)
+                policy.robots = parse_robots(result.content if result.status == 200 else None)
+                policy.set_crawl_delay(min(
+                    float(policy.robots.crawl_delay(self._user_agent) or 0),
+                    self.settings.max_crawl_delay,
+                ))
+
+        return policy.robots.can_fetch(self._user_agent, url)
+
+    @property
+    def _user_agent(self) -> str:
+        '''user agent matched against robots.txt rules'''
+        return self.settings.header.get('User-Agent', '*')
+
+    def _get_timeout(self, deadline: Optional[float]) -> Union[aiohttp.ClientTimeout, Any]:
+        '''returns request timeout, None if the deadline has already passed'''
+        total = None
+        if deadline is not None:
+            total = deadline - asyncio.get_running_loop().time()
+            if total <= 0:
+                return None
+
+        return aiohttp.ClientTimeout(
+            total=total,
+            sock_connect=self.settings.connect_timeout,
+            sock_read=self.settings.read_timeout,
+        )
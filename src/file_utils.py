@@ -0,0 +1,22 @@
+'''
+file helpers shared by the caches, the metrics and the dns cache
+'''
+
+import os
+from pathlib import Path
+from typing import Union
+
+
+def write_atomic(path: Union[str, Path], data: Union[str, bytes]) -> None:
+    '''
+    writes file through a temporary file in the same directory, so readers
+    never see partial data. Temporary files are named after the process, so
+    several processes can write the same file
+    '''
+    path = Path(path)
+    temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    with open(temp_path, 'wb') as file:
+        file.write(data)
+    os.replace(temp_path, path)
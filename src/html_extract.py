@@ -0,0 +1,178 @@
+'''
+functions that collect links, text and address of a page in a single walk
+over its html, either with a streaming parser or over a bs4 soup
+'''
+
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Any, List, Optional, Tuple, Union
+
+import bs4
+
+import src.parsing_utils as pu
+from src.request_utils import convert_content_into_soup
+
+STREAM_PARSER = 'stream'
+ADDRESS_PREFIX = 'address'
+ADDRESS_TAGS = ('a', 'div', 'span', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+HIDDEN_TAGS = ('script', 'style', 'template')
+
+
+@dataclass
+class PageContent():
+    '''class stores everything extracted from a page'''
+    links: List[str] = field(default_factory=list)
+    strings: List[str] = field(default_factory=list)
+    address: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        '''text of the page, strings are joined the same way as in bs4'''
+        return ''.join(self.strings)
+
+    @property
+    def visible_text(self) -> str:
+        '''text of the page with strings separated, used for keyword search'''
+        return ' '.join(self.strings)
+
+
+class PageExtractor(HTMLParser):
+    '''
+    parser collects anchors, visible strings and the address in one pass
+
+    Address is the text of the first a, div, span or header element whose text
+    starts with `address`. Open elements only remember where their text starts,
+    so checking an element costs the same whatever its nesting depth.
+    '''
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.links: List[str] = []
+        self.strings: List[str] = []
+        # open elements as tag, opening order, index of their first string
+        self._open: List[Tuple[str, int, int]] = []
+        self._opened = 0
+        self._hidden = 0
+        self._address: Optional[Tuple[int, int, int]] = None
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Any]]) -> None:
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+        if tag in HIDDEN_TAGS:
+            self._hidden += 1
+
+        self._open.append((tag, self._opened, len(self.strings)))
+        self._opened += 1
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Any]]) -> None:
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        for idx in range(len(self._open) - 1, -1, -1):
+            if self._open[idx][0] == tag:
+                break
+        else:
+            return
+
+        while len(self._open) > idx:
+            self._close_element(*self._open.pop())
+
+    def handle_data(self, data: str) -> None:
+        if not self._hidden and data:
+            self.strings.append(data)
+
+    def close(self) -> None:
+        super().close()
+        while self._open:
+            self._close_element(*self._open.pop())
+
+    def get_content(self) -> PageContent:
+        '''returns the extracted page content'''
+        address = None
+        if self._address:
+            _, start, end = self._address
+            address = ''.join(self.strings[start:end])
+
+        return PageContent(
+            links=pu.clean_links(self.links),
+            strings=self.strings,
+            address=address,
+        )
+
+    def _close_element(self, tag: str, order: int, start: int) -> None:
+        '''checks whether the closed element is the first address element'''
+        if tag in HIDDEN_TAGS:
+            self._hidden -= 1
+            return
+
+        if tag not in ADDRESS_TAGS:
+            return
+
+        if self._address and self._address[0] < order:
+            return
+
+        if _strings_start_with(self.strings, start, len(self.strings), ADDRESS_PREFIX):
+            self._address = (order, start, len(self.strings))
+
+
+def _strings_start_with(strings: List[str], start: int, end: int, prefix: str) -> bool:
+    '''checks whether joined strings start with the prefix, case insensitive'''
+    collected = ''
+    for idx in range(start, end):
+        collected += strings[idx].lower()
+        if len(collected) >= len(prefix):
+            break
+
+    return collected.startswith(prefix)
+
+
+def _tag_starts_with(tag: bs4.Tag, prefix: str) -> bool:
+    '''checks whether text of the tag starts with the prefix, case insensitive'''
+    collected = ''
+    for string in tag.strings:
+        collected += string.lower()
+        if len(collected) >= len(prefix):
+            break
+
+    return collected.startswith(prefix)
+
+
+def extract_from_soup(soup: bs4.BeautifulSoup) -> PageContent:
+    '''collects page content from a soup built by any bs4 parser'''
+    address_element = soup.find(
+        lambda tag: tag.name in ADDRESS_TAGS and _tag_starts_with(tag, ADDRESS_PREFIX)
+    )
+
+    return PageContent(
+        links=pu.get_links(soup) or [],
+        strings=list(soup.strings),
+        address=address_element.get_text() if address_element else None,
+    )
+
+
+def extract_page(content: str, parser: str = STREAM_PARSER) -> Union[PageContent, Any]:
+    '''
+    extracts links, text and address from the html content
+
+    Args:
+        content: html of the page
+        parser: `stream` for the single pass parser or name of a bs4 parser
+            (`html.parser`, `lxml`, `html5lib`)
+
+    Returns:
+        extracted content or None if there is no content
+    '''
+    if not content:
+        return None
+
+    if parser == STREAM_PARSER:
+        extractor = PageExtractor()
+        extractor.feed(content)
+        extractor.close()
+        return extractor.get_content()
+
+    return extract_from_soup(convert_content_into_soup(content, parser))
@@ -0,0 +1,159 @@
+'''
+on-disk cache of http responses, so that re-runs of the scraper read
+unchanged pages from the disk instead of downloading them again
+'''
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from src.file_utils import write_atomic
+from src.url_utils import canonicalize_url
+
+META_SUFFIX = '.json'
+BODY_SUFFIX = '.html'
+
+
+@dataclass
+class CacheEntry():
+    '''class stores a cached response and its validators'''
+    url: str
+    status: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    fetched_at: float = 0
+    content: str = ''
+
+    @property
+    def etag(self) -> Optional[str]:
+        '''entity tag sent by the server'''
+        return self.headers.get('ETag')
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        '''last modification date sent by the server'''
+        return self.headers.get('Last-Modified')
+
+    def is_fresh(self, ttl: float) -> bool:
+        '''whether the entry can be used without asking the server'''
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        '''headers that let the server answer with 304 if nothing changed'''
+        return conditional_headers(self.etag, self.last_modified)
+
+
+def conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    '''returns request headers that let the server answer with 304 if nothing changed'''
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    return headers
+
+
+class ResponseCache():
+    '''
+    class stores response bodies and metadata in a directory
+
+    Each url is stored under the hash of its normalized form as a body file and
+    a metadata file. The modification time of the metadata file is refreshed on
+    every read, so the least recently used entries are evicted first once the
+    cache grows above `max_size` bytes. Files are replaced atomically, so several
+    worker processes can share one cache directory.
+    '''
+    path: Path
+
+    def __init__(self, path: Union[str, Path], ttl: float, max_size: int) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._size = self._get_size()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        '''returns cached entry of the url, None if there is none'''
+        meta_path, body_path = self._get_paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            content = body_path.read_text(encoding='utf-8')
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+
+        return CacheEntry(**meta, content=content)
+
+    def put(self, url: str, status: int, headers: Dict[str, str], content: str) -> None:
+        '''stores response of the url'''
+        entry = CacheEntry(
+            url=url,
+            status=status,
+            headers=headers,
+            fetched_at=time.time(),
+        )
+        meta_path, body_path = self._get_paths(url)
+        meta_path.parent.mkdir(exist_ok=True)
+
+        body = content.encode('utf-8')
+        write_atomic(body_path, body)
+        self._write_meta(entry)
+
+        self._size += len(body)
+        if self._size > self.max_size:
+            self.evict()
+
+    def touch(self, entry: CacheEntry) -> None:
+        '''marks entry as fetched now, used after a successful revalidation'''
+        entry.fetched_at = time.time()
+        self._write_meta(entry)
+
+    def evict(self) -> None:
+        '''removes least recently used entries until the cache fits its size'''
+        entries = []
+        for meta_path in self.path.glob(f'*/*{META_SUFFIX}'):
+            body_path = meta_path.with_suffix(BODY_SUFFIX)
+            try:
+                entries.append(
+                    (meta_path.stat().st_mtime, body_path.stat().st_size, meta_path, body_path))
+            except OSError:
+                continue
+
+        self._size = sum(entry[1] for entry in entries)
+        target_size = self.max_size * 0.9
+        for _, size, meta_path, body_path in sorted(entries, key=lambda entry: entry[0]):
+            if self._size <= target_size:
+                break
+            meta_path.unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+            self._size -= size
+
+    def _write_meta(self, entry: CacheEntry) -> None:
+        '''writes metadata file of the entry'''
+        meta = asdict(entry)
+        meta.pop('content')
+        meta_path, _ = self._get_paths(entry.url)
+        write_atomic(meta_path, json.dumps(meta))
+
+    def _get_paths(self, url: str):
+        '''returns paths of the metadata and the body file of the url'''
+        key = hashlib.sha256((canonicalize_url(url) or url).encode('utf-8')).hexdigest()
+        folder = self.path / key[:2]
+        return folder / f'{key}{META_SUFFIX}', folder / f'{key}{BODY_SUFFIX}'
+
+    def _get_size(self) -> int:
+        '''returns total size of all cached bodies'''
+        size = 0
+        for body_path in self.path.glob(f'*/*{BODY_SUFFIX}'):
+            try:
+                size += body_path.stat().st_size
+            except OSError:
+                continue
+
+        return size
+
@@ -0,0 +1,150 @@
+'''
+keyword matcher finds all keywords of the project in a single pass over the text
+'''
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class KeywordMatches():
+    '''class stores number of occurrences and start positions of each keyword'''
+    counts: Dict[str, int] = field(default_factory=dict)
+    positions: Dict[str, List[int]] = field(default_factory=dict)
+
+    def found(self) -> Dict[str, bool]:
+        '''returns a flag for each keyword, whether it was found at least once'''
+        return {keyword: count > 0 for keyword, count in self.counts.items()}
+
+
+class KeywordMatcher():
+    '''
+    class compiles all keywords into a single pattern shaped as a prefix tree
+
+    Keywords are matched literally and case insensitive, so characters like `.`
+    or `+` have no special meaning. As the pattern is a prefix tree, the regex
+    engine checks each position of the text against the first characters of all
+    keywords at once, so the cost of a scan barely depends on the number of
+    keywords. The scan restarts one character after the start of each match, so
+    overlapping keywords are found as well. Positions refer to the lower case
+    text, which is the original text for all but a few exotic characters.
+
+    Args:
+        keywords: list of keywords to be searched for
+        word_boundary: match keywords only as whole words
+        ignore_whitespace: any run of whitespace matches a space in a keyword
+    '''
+
+    def __init__(
+        self,
+        keywords: List[str],
+        word_boundary: bool = False,
+        ignore_whitespace: bool = True,
+    ) -> None:
+        self.keywords = list(dict.fromkeys(keywords))
+        self.word_boundary = word_boundary
+        self.ignore_whitespace = ignore_whitespace
+
+        self._keys = {self._normalize(keyword): keyword for keyword in self.keywords}
+        self._pattern = re.compile(self._wrap(_build_tree_pattern(
+            _build_tree(self._keys), ignore_whitespace)))
+
+        # shorter keywords starting at the same position as a longer match
+        compiled = {
+            key: re.compile(self._wrap(self._keyword_pattern(key))) for key in self._keys
+        }
+        self._prefixes = {
+            key: [
+                (other, compiled[other]) for other in self._keys
+                if other != key and compiled[other].match(key)
+            ]
+            for key in self._keys
+        }
+
+    def search(self, text: str) -> KeywordMatches:
+        '''finds all keywords in the text'''
+        matches = KeywordMatches(
+            counts={keyword: 0 for keyword in self.keywords},
+            positions={keyword: [] for keyword in self.keywords},
+        )
+        if not text or not self.keywords:
+            return matches
+
+        text = text.lower()
+        position = 0
+        while True:
+            match = self._pattern.search(text, position)
+            if not match:
+                break
+
+            position = match.start()
+            key = self._normalize(match.group())
+            self._add_match(matches, self._keys[key], position)
+            for prefix, prefix_pattern in self._prefixes[key]:
+                if prefix_pattern.match(text, position):
+                    self._add_match(matches, self._keys[prefix], position)
+
+            position += 1
+
+        return matches
+
+    @staticmethod
+    def _add_match(matches: KeywordMatches, keyword: str, position: int) -> None:
+        '''registers a single occurrence of the keyword'''
+        matches.counts[keyword] += 1
+        matches.positions[keyword].append(position)
+
+    def _normalize(self, keyword: str) -> str:
+        '''returns the form under which a keyword or a matched text is looked up'''
+        keyword = keyword.lower()
+        if self.ignore_whitespace:
+            keyword = ' '.join(keyword.split())
+
+        return keyword
+
+    def _keyword_pattern(self, key: str) -> str:
+        '''returns regular expression matching a single normalized keyword'''
+        if self.ignore_whitespace:
+            return r'\s+'.join(re.escape(part) for part in key.split(' '))
+
+        return re.escape(key)
+
+    def _wrap(self, pattern: str) -> str:
+        '''adds word boundaries to the pattern if required'''
+        if self.word_boundary:
+            return rf'(?<!\w)(?:{pattern})(?!\w)'
+
+        return pattern
+
+
+def _build_tree(keys: Dict[str, str]) -> Dict:
+    '''builds prefix tree of the keywords, an empty key marks end of a keyword'''
+    tree: Dict = {}
+    for key in keys:
+        node = tree
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    return tree
+
+
+def _build_tree_pattern(node: Dict, ignore_whitespace: bool) -> str:
+    '''converts prefix tree into a regular expression preferring longest matches'''
+    branches = []
+    for char, child in sorted(node.items()):
+        if not char:
+            continue
+        char_pattern = r'\s+' if char == ' ' and ignore_whitespace else re.escape(char)
+        branches.append(char_pattern + _build_tree_pattern(child, ignore_whitespace))
+
+    if not branches:
+        return ''
+
+    pattern = branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+    if '' in node:
+        # keyword ends here, but a longer one may continue
+        return f'(?:{pattern})?'
+
+    return pattern
@@ -0,0 +1,113 @@
+'''
+link classifier sorts all links of a page into phones, emails, social
+networks, pages of the same site and external pages in a single pass
+'''
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.url_utils import canonicalize_url, get_host
+
+# links to files that are not html pages
+SKIPPED_EXTENSIONS = (
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.zip', '.jpg',
+    '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.mp3', '.mp4', '.css',
+    '.js', '.xml', '.json',
+)
+NON_DIGITS = re.compile(r'\D')
+
+
+@dataclass
+class LinkBuckets():
+    '''
+    class stores links of a page sorted by their kind
+
+    `links` holds every link once in the order of the page, web links in
+    canonical form. Buckets keep the order in which links were found, social
+    links are kept in the order of the social networks of the classifier.
+    '''
+    links: List[str] = field(default_factory=list)
+    phones: List[str] = field(default_factory=list)
+    emails: List[str] = field(default_factory=list)
+    social: Tuple[List[str], ...] = ()
+    self_links: List[str] = field(default_factory=list)
+    external: List[str] = field(default_factory=list)
+
+
+class LinkClassifier():
+    '''
+    class compiles the link identifiers of the project once and classifies
+    links of a page in a single pass
+
+    Links starting with the phone or email identifier are phones or emails,
+    phones are reduced to their digits. Links containing the name of a social
+    network are social links of that network. Web links are resolved against
+    the page and canonicalized, the ones on the host of the page are pages of
+    the same site, all others are external. Pages of the same site lose their
+    query, links to files like pdfs or images are not pages.
+
+    Args:
+        phone_identifier: prefix of phone links, like `tel:`
+        email_identifier: prefix of email links, like `mailto:`
+        social_links: names of social networks as they appear in their links
+    '''
+
+    def __init__(
+        self,
+        phone_identifier: str,
+        email_identifier: str,
+        social_links: List[str],
+    ) -> None:
+        self.phone_identifier = phone_identifier.lower()
+        self.email_identifier = email_identifier.lower()
+        self.social_links = list(social_links)
+        self._social_index = {social: idx for idx, social in enumerate(self.social_links)}
+        self._social_pattern: Optional[re.Pattern] = re.compile(
+            '|'.join(re.escape(social) for social in self.social_links)
+        ) if self.social_links else None
+
+    def classify(self, links: List[str], page_link: str) -> LinkBuckets:
+        '''returns links found on the page sorted into buckets, the page itself is skipped'''
+        host = get_host(page_link)
+        found: Dict[str, None] = {}
+        phones: Dict[str, None] = {}
+        emails: Dict[str, None] = {}
+        social_links: List[Dict[str, None]] = [{} for _ in self.social_links]
+        self_links: Dict[str, None] = {}
+        external: Dict[str, None] = {}
+
+        for raw_link in links:
+            canonical = canonicalize_url(raw_link, page_link)
+            link = canonical or raw_link
+            if link == page_link or link in found:
+                continue
+            found[link] = None
+
+            if self._social_pattern:
+                for social in set(self._social_pattern.findall(link)):
+                    social_links[self._social_index[social]][link] = None
+
+            prefix = link[:max(len(self.phone_identifier), len(self.email_identifier))].lower()
+            if prefix.startswith(self.phone_identifier):
+                phone = NON_DIGITS.sub('', link[len(self.phone_identifier):])
+                if phone:
+                    phones[phone] = None
+            elif prefix.startswith(self.email_identifier):
+                emails[link[len(self.email_identifier):]] = None
+            elif canonical:
+                if get_host(link) != host:
+                    external[link] = None
+                    continue
+                page = link.split('?', 1)[0]
+                if page != page_link and not page.lower().endswith(SKIPPED_EXTENSIONS):
+                    self_links[page] = None
+
+        return LinkBuckets(
+            links=list(found),
+            phones=list(phones),
+            emails=list(emails),
+            social=tuple(list(values) for values in social_links),
+            self_links=list(self_links),
+            external=list(external),
+        )
@@ -3,11 +3,17 @@
 from pathlib import Path
 from typing import List
 
+from src.url_utils import canonicalize_url
+
 
 def load_sites(path: Path) -> List[str]:
-    '''loads list of sites from a given path'''
+    '''
+    loads list of sites from a given path
+    links are canonicalized, so different spellings of a site are loaded once
+    '''
 
     with open(path, 'r', encoding='utf-8') as file:
         content = file.readlines()
 
-    return [link.strip() for link in content]
+    links = (canonicalize_url(link) for link in content)
+    return list(dict.fromkeys(link for link in links if link))
@@ -0,0 +1,330 @@
+'''
+metrics of every stage of the pipeline: fetch, parse, extract and write.
+Each process records into its own registry, snapshots of all processes are
+merged into a json summary and a prometheus text file
+'''
+
+import bisect
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+from src.file_utils import write_atomic
+from src.settings import Settings
+
+# upper bounds of histogram buckets in seconds
+BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+SNAPSHOT_PREFIX = 'process-'
+SUMMARY_NAME = 'summary.json'
+PROMETHEUS_NAME = 'metrics.prom'
+METRIC_PREFIX = 'scraper_'
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram():
+    '''class counts observations in fixed buckets, like a prometheus histogram'''
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.
+
+    def observe(self, value: float) -> None:
+        '''adds a single observation'''
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        '''adds observations of a snapshot of another histogram'''
+        self.counts = [count + other for count, other in zip(self.counts, data['counts'])]
+        self.count += data['count']
+        self.sum += data['sum']
+
+    def quantile(self, share: float) -> float:
+        '''returns upper bound of the bucket holding the quantile'''
+        rank = share * self.count
+        total = 0
+        for bound, count in zip((*BUCKETS, float('inf')), self.counts):
+            total += count
+            if total >= rank and count:
+                return bound
+
+        return 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        '''returns snapshot of the histogram'''
+        return {'counts': list(self.counts), 'count': self.count, 'sum': self.sum}
+
+
+class Metrics():
+    '''
+    class is the metric registry of a single process
+
+    Counters and histograms are identified by a name and optional labels.
+    Recording is a dictionary lookup and an addition, so stages can be timed
+    on every page without slowing the crawl down.
+    '''
+
+    def __init__(self) -> None:
+        self.counters: Dict[Key, float] = {}
+        self.histograms: Dict[Key, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        '''increases a counter'''
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        '''adds an observation to a histogram'''
+        key = _key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        '''observes time spent inside of the block'''
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def clear(self) -> None:
+        '''drops everything recorded so far'''
+        self.counters = {}
+        self.histograms = {}
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        '''returns json serializable copy of all metrics'''
+        return {
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in list(self.counters.items())
+            ],
+            'histograms': [
+                {'name': name, 'labels': dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in list(self.histograms.items())
+            ],
+        }
+
+    def merge(self, snapshot: Dict[str, List[Dict[str, Any]]]) -> None:
+        '''adds metrics of a snapshot, usually one of another process'''
+        for counter in snapshot.get('counters', []):
+            self.inc(counter['name'], counter['value'], **counter['labels'])
+        for data in snapshot.get('histograms', []):
+            key = _key(data['name'], data['labels'])
+            self.histograms.setdefault(key, Histogram()).merge(data)
+
+    def summary(self) -> Dict[str, Any]:
+        '''returns counters and histogram statistics keyed by name and labels'''
+        return {
+            'counters': {
+                _format_key(key): value for key, value in sorted(self.counters.items())
+            },
+            'histograms': {
+                _format_key(key): {
+                    'count': histogram.count,
+                    'sum': round(histogram.sum, 6),
+                    'mean': round(histogram.sum / histogram.count, 6) if histogram.count else 0,
+                    'p50': histogram.quantile(0.5),
+                    'p99': histogram.quantile(0.99),
+                }
+                for key, histogram in sorted(self.histograms.items())
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        '''returns metrics in the prometheus text exposition format'''
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f'# TYPE {METRIC_PREFIX}{name} counter')
+            lines.extend(
+                f'{METRIC_PREFIX}{name}{_format_labels(labels)} {value}'
+                for (key_name, labels), value in sorted(self.counters.items())
+                if key_name == name
+            )
+
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f'# TYPE {METRIC_PREFIX}{name} histogram')
+            for (key_name, labels), histogram in sorted(self.histograms.items()):
+                if key_name != name:
+                    continue
+                total = 0
+                for bound, count in zip((*BUCKETS, '+Inf'), histogram.counts):
+                    total += count
+                    bucket_labels = _format_labels((*labels, ('le', str(bound))))
+                    lines.append(f'{METRIC_PREFIX}{name}_bucket{bucket_labels} {total}')
+                lines.append(f'{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'{METRIC_PREFIX}{name}_count{_format_labels(labels)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# registry of the current process
+METRICS = Metrics()
+
+
+class MetricsReporter():
+    '''
+    class writes metrics of the process to `metrics_path` in the background
+
+    Every `metrics_interval` seconds, and once more when it stops, the reporter
+    saves a snapshot of the process registry. The reporter of the main process
+    (`merge=True`) also merges the snapshots of all processes into a json
+    summary and a prometheus text file. It removes snapshots of earlier runs
+    when it starts, so it has to start before the worker processes.
+    '''
+    settings: Settings
+
+    def __init__(self, settings: Settings, merge: bool = False) -> None:
+        self.settings = settings
+        self.merge = merge
+        self.path = Path(settings.metrics_path) if settings.metrics_path else None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        '''starts the background thread'''
+        if not self.path:
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        if self.merge:
+            for file_path in self.path.glob(f'{SNAPSHOT_PREFIX}*.json'):
+                file_path.unlink()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''stops the background thread and writes the final metrics'''
+        if not self._thread:
+            return
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self.report()
+
+    def report(self) -> None:
+        '''saves snapshot of the process, merges all snapshots in the main process'''
+        write_atomic(
+            self.path / f'{SNAPSHOT_PREFIX}{os.getpid()}.json',  # type: ignore
+            json.dumps(METRICS.snapshot()),
+        )
+        if self.merge:
+            merged = read_metrics(self.path)  # type: ignore
+            write_atomic(self.path / SUMMARY_NAME, json.dumps(merged.summary(), indent=2))  # type: ignore
+            write_atomic(self.path / PROMETHEUS_NAME, merged.to_prometheus())  # type: ignore
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.settings.metrics_interval):
+            self.report()
+
+
+def read_metrics(path: Path) -> Metrics:
+    '''returns metrics merged from the snapshots of all processes'''
+    merged = Metrics()
+    for file_path in sorted(path.glob(f'{SNAPSHOT_PREFIX}*.json')):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            merged.merge(json.load(file))
+
+    return merged
+
+
+@contextmanager
+def profiled(settings: Settings) -> Iterator[None]:
+    '''
+    profiles the block with cProfile if `profile` is set, the stats are saved
+    as `profile-<pid>.prof` in `metrics_path`, to be read with pstats or snakeviz
+    '''
+    if not settings.profile or not settings.metrics_path:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        Path(settings.metrics_path).mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(Path(settings.metrics_path) / f'profile-{os.getpid()}.prof')
+
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    '''
+    returns aiohttp trace config observing dns lookup, connection setup and
+    time to the first byte of every request
+    '''
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_request_start(_session, context: SimpleNamespace, _params) -> None:
+        context.request_start = time.perf_counter()
+
+    async def on_dns_start(_session, context: SimpleNamespace, _params) -> None:
+        context.dns_start = time.perf_counter()
+
+    async def on_dns_end(_session, context: SimpleNamespace, _params) -> None:
+        METRICS.observe('fetch_dns_seconds', time.perf_counter() - context.dns_start)
+
+    async def on_connection_start(_session, context: SimpleNamespace, _params) -> None:
+        context.connection_start = time.perf_counter()
+
+    async def on_connection_end(_session, context: SimpleNamespace, _params) -> None:
+        METRICS.observe('fetch_connect_seconds', time.perf_counter() - context.connection_start)
+
+    async def on_connection_reused(_session, _context, _params) -> None:
+        METRICS.inc('fetch_connections_reused_total')
+
+    async def on_request_end(_session, context: SimpleNamespace, _params) -> None:
+        METRICS.observe('fetch_ttfb_seconds', time.perf_counter() - context.request_start)
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_dns_resolvehost_start.append(on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_end)
+    trace_config.on_connection_create_start.append(on_connection_start)
+    trace_config.on_connection_create_end.append(on_connection_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reused)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _format_key(key: Key) -> str:
+    '''returns name and labels of a metric as a single text'''
+    name, labels = key
+    return f'{name}{_format_labels(labels)}'
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{label}="{value}"' for label, value in labels) + '}'
+
@@ -0,0 +1,198 @@
+'''
+mock farm is a local http server serving synthetic sites, used to benchmark
+the scrape pipeline without sending a single request to the internet
+'''
+
+import asyncio
+import multiprocessing
+import random
+import socket
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+from aiohttp import web
+
+from src.dns_cache import DnsCache
+
+# reserved top level domain, names below it never resolve on the internet
+FARM_DOMAIN = 'farm.test'
+FILLER_WORDS = (
+    'care', 'support', 'home', 'family', 'service', 'people', 'community', 'health',
+    'local', 'team', 'plan', 'help', 'quality', 'living', 'daily', 'provider',
+)
+SOCIAL_HOSTS = ('facebook.com', 'linkedin.com', 'instagram.com')
+
+
+@dataclass
+class FarmConfig():
+    '''class stores shape and behaviour of the synthetic sites'''
+    n_sites: int = 100
+    port: int = 8900
+    fan_out: int = 10
+    depth: int = 2
+    page_size: int = 20000
+    latency: float = 0.05
+    latency_jitter: float = 0.5
+    error_rate: float = 0.01
+    seed: int = 0
+
+
+class MockFarm():
+    '''
+    class runs the farm in a separate process, so serving pages does not share
+    an event loop with the scraper being measured
+
+    Every site is a host `site<n>.farm.test` on the same local port. Hosts are
+    not resolvable, they are stored in the dns cache of the scraper instead,
+    so every site still gets its own connection pool and politeness policy.
+    Pages link to `fan_out` child pages down to `depth` levels, a share of
+    `error_rate` requests fails with 500, every response is delayed by
+    `latency` seconds give or take `latency_jitter` of it.
+    '''
+    config: FarmConfig
+
+    def __init__(self, config: FarmConfig) -> None:
+        self.config = config
+        self.requests: Any = multiprocessing.Value('l', 0)
+        self._process: Union[multiprocessing.Process, Any] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def site_links(self) -> List[str]:
+        '''returns main page links of all sites of the farm'''
+        return [
+            f'http://{get_site_host(idx)}:{self.config.port}/'
+            for idx in range(self.config.n_sites)
+        ]
+
+    def seed_dns(self, cache: DnsCache) -> None:
+        '''points all hosts of the farm to the local server and saves the cache'''
+        for idx in range(self.config.n_sites):
+            host = get_site_host(idx)
+            cache.put(host, [{
+                'hostname': host, 'host': '127.0.0.1', 'port': 0,
+                'family': socket.AF_INET, 'proto': 0, 'flags': 0,
+            }])
+        cache.save()
+
+    def start(self) -> None:
+        '''starts the server process and waits until it accepts connections'''
+        ready = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(self.config, self.requests, ready), daemon=True)
+        self._process.start()
+        if not ready.wait(timeout=10):
+            self.stop()
+            raise RuntimeError(f'Mock farm did not start on port {self.config.port}')
+
+    def stop(self) -> None:
+        '''stops the server process'''
+        if not self._process:
+            return
+
+        self._process.terminate()
+        self._process.join()
+        self._process = None
+
+
+def get_site_host(idx: int) -> str:
+    '''returns host name of a site of the farm'''
+    return f'site{idx}.{FARM_DOMAIN}'
+
+
+class _FarmApp():
+    '''request handler generating pages of the farm, pages are built once'''
+
+    def __init__(self, config: FarmConfig, requests: Any) -> None:
+        self.config = config
+        self.requests = requests
+        self.random = random.Random(config.seed)
+        self._pages: Dict[str, str] = {}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        '''serves a single page of the site named by the host header'''
+        if request.path == '/robots.txt':
+            return web.Response(status=404)
+
+        with self.requests.get_lock():
+            self.requests.value += 1
+
+        latency = self.config.latency * (
+            1 + self.config.latency_jitter * self.random.uniform(-1, 1))
+        await asyncio.sleep(max(0., latency))
+
+        if self.random.random() < self.config.error_rate:
+            return web.Response(status=500, text='synthetic error')
+
+        host = (request.host or '').split(':')[0]
+        page = self._get_page(host, request.path)
+        if page is None:
+            return web.Response(status=404, text='not found')
+
+        return web.Response(text=page, content_type='text/html')
+
+    def _get_page(self, host: str, path: str) -> Optional[str]:
+        '''returns html of the page, None if the farm has no such page'''
+        key = f'{host}{path}'
+        if key not in self._pages:
+            levels = [part for part in path.split('/') if part]
+            if len(levels) > self.config.depth:
+                return None
+            self._pages[key] = make_page(host, levels, self.config)
+
+        return self._pages[key]
+
+
+def make_page(host: str, levels: List[str], config: FarmConfig) -> str:
+    '''
+    builds a synthetic page, the same site and path always give the same page
+    main pages carry contact details, all pages carry a keyword and filler text
+    '''
+    rng = random.Random(f'{config.seed}/{host}/{"/".join(levels)}')
+    path = ''.join(f'/{level}' for level in levels)
+    parts = [f'<html><head><title>{host}</title></head><body><h1>{host}</h1>']
+
+    if len(levels) < config.depth:
+        parts.extend(
+            f'<a href="{path}/page-{idx}">page {idx}</a>' for idx in range(config.fan_out))
+    if not levels:
+        site = host.split('.')[0]
+        parts.append(
+            f'<a href="tel:02{rng.randrange(10 ** 8):08d}">call</a>'
+            f'<a href="mailto:info@{host}">mail</a>'
+            f'<a href="https://{rng.choice(SOCIAL_HOSTS)}/{site}">social</a>'
+            f'<p>{rng.randrange(1, 200)} Main Street, Sydney NSW 2000</p>'
+        )
+    parts.append(f'<p>{rng.choice(("NDIS", "Aged Care", "Nursing", "Personal Care"))}</p>')
+
+    size = sum(len(part) for part in parts)
+    words = []
+    while size < config.page_size:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    parts.append(f'<p>{" ".join(words)}</p></body></html>')
+
+    return ''.join(parts)
+
+
+def _serve(config: FarmConfig, requests: Any, ready: Any) -> None:
+    '''entry point of the server process'''
+
+    async def serve() -> None:
+        farm = _FarmApp(config, requests)
+        app = web.Application()
+        app.router.add_route('GET', '/{path:.*}', farm.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', config.port, backlog=1024).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
@@ -0,0 +1,135 @@
+'''
+politeness rules of a single host: request rate, pauses asked for by the
+server and the rules of its robots.txt
+'''
+
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional, Union
+from urllib.robotparser import RobotFileParser
+
+# statuses telling that the host is overloaded and wants us to slow down
+SLOW_DOWN_STATUSES = (429, 503)
+
+
+class HostPolicy():
+    '''
+    class spaces requests to a single host
+
+    Requests are limited by a token bucket: the bucket holds up to `burst`
+    tokens and gets a new one every `interval` seconds. A Crawl-delay of the
+    robots.txt stretches the interval and allows no bursts. A host answering
+    with 429 or 503 is paused for the time given in its Retry-After header, or
+    for an exponentially growing time if there is none.
+
+    Args:
+        rate: requests per second
+        burst: number of requests that can be sent at once after a quiet period
+        max_pause: upper limit of a single pause in seconds
+    '''
+
+    def __init__(self, rate: float, burst: int, max_pause: float) -> None:
+        self.interval = 1 / rate if rate > 0 else 0
+        self.burst = max(1, burst)
+        self.max_pause = max_pause
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.
+        self.strikes = 0
+        self.robots: Union[RobotFileParser, Any] = None
+        self.robots_lock = asyncio.Lock()
+        self._turn_lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        '''
+        waits until the host can take another request, returns time waited
+        requests get their turn in the order they asked for it
+        '''
+        start_time = time.monotonic()
+        async with self._turn_lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait_time = self.paused_until - now
+                if wait_time <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - start_time
+
+                await asyncio.sleep(max(wait_time, (1 - self.tokens) * self.interval))
+
+    def is_idle(self, now: float) -> bool:
+        '''
+        whether forgetting the policy would not make us any less polite:
+        nobody waits for the host, it is not paused and its bucket is full
+        '''
+        if self._turn_lock.locked() or self.robots_lock.locked() or self.paused_until > now:
+            return False
+
+        self._refill(now)
+        return self.tokens >= self.burst
+
+    def set_crawl_delay(self, delay: float) -> None:
+        '''spaces requests at least by the delay, without bursts'''
+        if delay <= 0:
+            return
+
+        self.interval = max(self.interval, delay)
+        self.burst = 1
+        self.tokens = min(self.tokens, 1)
+
+    def report(self, status: Optional[int], retry_after: Optional[str] = None) -> None:
+        '''pauses the host if it asked us to slow down, resets the pause otherwise'''
+        if status not in SLOW_DOWN_STATUSES:
+            if status is not None:
+                self.strikes = 0
+            return
+
+        pause = parse_retry_after(retry_after)
+        if pause is None:
+            pause = max(self.interval, 1) * 2 ** self.strikes
+        self.strikes += 1
+
+        self.paused_until = max(
+            self.paused_until, time.monotonic() + min(pause, self.max_pause))
+
+    def _refill(self, now: float) -> None:
+        '''adds tokens for the time passed since the last refill'''
+        if not self.interval:
+            self.tokens = float(self.burst)
+        else:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    '''returns seconds to wait from a Retry-After header, seconds or http date'''
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_time = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0., retry_time.timestamp() - time.time())
+
+
+def parse_robots(content: Optional[str]) -> RobotFileParser:
+    '''
+    returns parser of the robots.txt content
+
+    Without content, because the file is missing or could not be fetched,
+    every page is allowed.
+    '''
+    parser = RobotFileParser()
+    if content:
+        parser.parse(content.splitlines())
+    else:
+        parser.allow_all = True
+
+    return parser
@@ -1,47 +1,233 @@
 '''helper functions to make requests'''
 
+import asyncio
+import codecs
 import logging
 import re
-from typing import Any, Dict, Union
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence, Set, Union
 
+import aiohttp
 import bs4
-import requests
-import urllib3
-import validators
-from requests.exceptions import ConnectionError
+from aiohttp.abc import AbstractResolver
+
+from src.metrics import METRICS, create_trace_config
+from src.settings import Settings
+from src.url_utils import canonicalize_url
 
 logger = logging.getLogger(__name__)
-urllib3.disable_warnings()
+# bs4 parsers found missing in this process
+MISSING_PARSERS: Set[str] = set()
+
+RETRYABLE_ERRORS = ('timeout', 'connection reset', 'connection')
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Retry-After')
+CHUNK_SIZE = 2 ** 16
+# charset declared by a meta tag has to be within the first bytes of the page
+META_SNIFF_SIZE = 4096
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+# decodes any byte, used when neither the declared charset nor utf-8 fits
+FALLBACK_CHARSET = 'cp1252'
+
+
+@dataclass
+class FetchResult():
+    '''class stores outcome of a single page request'''
+    url: str
+    content: Optional[str] = None
+    status: Optional[int] = None
+    elapsed: float = 0
+    error: Optional[str] = None
+    error_detail: Optional[str] = None
+    attempts: int = 1
+    headers: Dict[str, str] = field(default_factory=dict)
+    cache: Optional[str] = None
+
+    @property
+    def retryable(self) -> bool:
+        '''whether the request failed with an error worth trying again'''
+        if self.error in RETRYABLE_ERRORS:
+            return True
+
+        return self.status in RETRYABLE_STATUSES
 
 
 def check_link(url: str) -> str:
-    '''validates the link and if not tries to correct it'''
-    url = re.sub(r'www\.', '', url)
-    validation_check = validators.url(url)
-    if not validation_check:
-        url = f'https://{url}/'
-        url = url[:-1] if url[-2:] == '//' else url
+    '''returns canonical form of the link, links that are not web links are kept as they are'''
+    return canonicalize_url(url) or url
+
+
+def create_session(
+    settings: Settings,
+    resolver: Union[AbstractResolver, Any] = None,
+) -> aiohttp.ClientSession:
+    '''
+    creates http session with a keep-alive connection pool
+
+    Connections are reused by all requests made through the session, so the
+    main page and all child pages of the same site share tcp and tls handshakes.
+    If a resolver is given, host names are resolved by it only and the dns cache
+    of aiohttp is turned off. Dns, connect and first byte times of every request
+    are recorded in the metrics. Must be called from inside of a running event loop.
+    '''
+
+    connector = aiohttp.TCPConnector(
+        limit=settings.max_connections,
+        limit_per_host=max(
+            [settings.max_connections_per_host, *settings.host_pool_sizes.values()]
+        ),
+        keepalive_timeout=settings.keepalive_timeout,
+        enable_cleanup_closed=True,
+        ssl=False,
+        resolver=resolver,
+        use_dns_cache=resolver is None,
+    )
+    return aiohttp.ClientSession(
+        headers=settings.header,
+        connector=connector,
+        trace_configs=[create_trace_config()],
+    )
+
+
+def classify_error(err: BaseException) -> str:
+    '''returns short name of the failure class of a request'''
+    if isinstance(err, asyncio.TimeoutError):
+        return 'timeout'
+
+    if isinstance(err, aiohttp.ClientConnectorError):
+        if isinstance(err.os_error, socket.gaierror):
+            return 'dns'
+        return 'connection'
+
+    if isinstance(err, (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError,
+                        aiohttp.ClientPayloadError, ConnectionResetError)):
+        return 'connection reset'
+
+    if isinstance(err, aiohttp.ClientConnectionError):
+        return 'connection'
 
-    return url
+    if isinstance(err, UnicodeDecodeError):
+        return 'decode'
 
+    return 'other'
 
-def get_page_content(url: str, header: Dict) -> Union[str, Any]:
-    '''gets content from a page'''
 
+async def get_page_content(
+    session: aiohttp.ClientSession,
+    url: str,
+    header: Dict,
+    timeout: Optional[aiohttp.ClientTimeout] = None,
+    max_size: Optional[int] = None,
+    content_types: Optional[Sequence[str]] = None,
+) -> FetchResult:
+    '''
+    gets content from a page, failures are reported in the result
+
+    The body is streamed and only read for successful responses. Responses
+    whose Content-Type is not one of `content_types` are dropped before their
+    body is read (`content type` error), bodies larger than `max_size` bytes
+    as soon as they grow above it (`too large` error). Responses without a
+    Content-Type are read.
+    '''
+
+    start_time = time.perf_counter()
+    result = FetchResult(url=url)
     try:
-        response = requests.get(url, headers=header, verify=False)
-        return response.content.decode()  # type:ignore
-    except ConnectionError:
-        return None
-    except Exception as err:
-        # print(f"Unexpected {err=}, {type(err)=}")
-        return None
+        async with session.get(url, headers=header, ssl=False, timeout=timeout) as response:
+            result.status = response.status
+            result.headers = {
+                name: response.headers[name]
+                for name in KEPT_HEADERS if name in response.headers
+            }
+            if response.status >= 400:
+                result.error = 'http'
+            elif response.status != 304:
+                if content_types and 'Content-Type' in response.headers and \
+                        response.content_type not in content_types:
+                    result.error = 'content type'
+                elif max_size and (response.content_length or 0) > max_size:
+                    result.error = 'too large'
+                else:
+                    with METRICS.timer('fetch_download_seconds'):
+                        body = await _read_body(response, max_size)
+                    if body is None:
+                        result.error = 'too large'
+                    else:
+                        result.content = decode_body(body, response.charset)
+
+            if result.error:
+                # the rest of the body is not read, so the connection cannot be reused
+                response.close()
+    except Exception as err:  # pylint: disable=broad-except
+        result.error = classify_error(err)
+        result.error_detail = f'{type(err).__name__}: {err}'
+
+    result.elapsed = time.perf_counter() - start_time
+    METRICS.observe('fetch_seconds', result.elapsed)
+    METRICS.inc('fetch_requests_total', outcome=result.error or result.status)
+    return result
+
 
+async def _read_body(
+    response: aiohttp.ClientResponse,
+    max_size: Optional[int],
+) -> Optional[bytes]:
+    '''reads the body chunk by chunk, returns None once it grows above max_size bytes'''
+    chunks = []
+    size = 0
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        size += len(chunk)
+        if max_size and size > max_size:
+            return None
+        chunks.append(chunk)
 
-def convert_content_into_soup(content: str) -> Union[bs4.BeautifulSoup, Any]:
-    '''converts given content into soup'''
+    return b''.join(chunks)
+
+
+def decode_body(body: bytes, charset: Optional[str] = None) -> str:
+    '''
+    decodes the body with the charset of the Content-Type header or of a meta
+    tag of the page. Without a usable charset utf-8 is tried, bodies that are
+    not valid utf-8 are decoded as cp1252, which never fails
+    '''
+    if not charset:
+        match = META_CHARSET.search(body, 0, META_SNIFF_SIZE)
+        charset = match.group(1).decode('ascii') if match else None
+
+    for encoding in (charset, 'utf-8'):
+        if not encoding:
+            continue
+        try:
+            codecs.lookup(encoding)
+            return body.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            pass
+
+    return body.decode(FALLBACK_CHARSET, errors='replace')
+
+
+def convert_content_into_soup(
+    content: str,
+    parser: str = 'html.parser'
+) -> Union[bs4.BeautifulSoup, Any]:
+    '''converts given content into soup, falls back to html.parser if the parser is not installed'''
 
     if not content:
         return None
 
-    return bs4.BeautifulSoup(content, 'html.parser')
+    if parser in MISSING_PARSERS:
+        parser = 'html.parser'
+
+    with METRICS.timer('soup_build_seconds', parser=parser):
+        try:
+            return bs4.BeautifulSoup(content, parser)
+        except bs4.FeatureNotFound:
+            # warned once per process, later pages go straight to html.parser
+            MISSING_PARSERS.add(parser)
+            METRICS.inc('parser_fallbacks_total', parser=parser)
+            logger.warning(
+                'Parser %s is not installed, falling back to html.parser. '
+                'Install it with the pinned requirements', parser)
+            return bs4.BeautifulSoup(content, 'html.parser')
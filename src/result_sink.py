@@ -0,0 +1,358 @@
+'''
+result sinks append scraped sites to the output as soon as they are done,
+so a crash loses at most the rows written since the last flush
+'''
+
+import ast
+import json
+import os
+import shutil
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.metrics import METRICS
+from src.settings import Settings
+
+OUTPUT_FORMATS = ('jsonl', 'parquet', 'sqlite')
+EXCEL_SUFFIXES = ('.xls', '.xlsx')
+SQL_TYPES = {
+    'str': 'TEXT',
+    'list': 'TEXT',
+    'bool': 'INTEGER',
+    'int': 'INTEGER',
+    'float': 'REAL',
+}
+
+
+def result_columns(settings: Settings) -> List[Tuple[str, str]]:
+    '''returns name and kind of every output column, in the order of Site.to_dict'''
+    return [
+        ('link', 'str'),
+        ('name', 'str'),
+        ('address', 'str'),
+        ('found phones', 'list'),
+        ('found emails', 'list'),
+        *((social, 'list') for social in settings.social_links),
+        *((keyword, 'bool') for keyword in settings.key_words),
+        ('site_text', 'str'),
+        ('next level links', 'list'),
+        ('fetch status', 'int'),
+        ('fetch error', 'str'),
+        ('fetch time', 'float'),
+    ]
+
+
+def get_output_path(settings: Settings) -> Path:
+    '''returns path of the output, a directory of part files for parquet'''
+    path = Path(settings.output_path)
+    if settings.output_format == 'parquet':
+        return path
+
+    return path.with_suffix(f'.{settings.output_format}')
+
+
+class ResultSink(ABC):
+    '''
+    base class of all result sinks
+
+    Rows are flushed every `flush_every` rows or `flush_interval` seconds,
+    whatever comes first. With `fsync` enabled each flush also waits until the
+    data reaches the disk. `on_flush` is called after every flush, once the
+    written rows are stored.
+    '''
+    settings: Settings
+
+    def __init__(self, settings: Settings, on_flush: Optional[Callable[[], None]] = None) -> None:
+        self.settings = settings
+        self.on_flush = on_flush
+        self.path = get_output_path(settings)
+        self.columns = result_columns(settings)
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        '''appends a single site to the output'''
+        with METRICS.timer('sink_write_seconds', format=self.settings.output_format):
+            self._write(self._normalize(row))
+        self._pending += 1
+
+        if self._pending >= self.settings.flush_every or \
+                time.monotonic() - self._last_flush >= self.settings.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        '''makes all written rows durable'''
+        if self._pending:
+            with METRICS.timer('sink_flush_seconds', format=self.settings.output_format):
+                self._flush()
+            if self.on_flush:
+                self.on_flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        '''flushes remaining rows and releases the output'''
+        self.flush()
+
+    def _normalize(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        '''returns row with every column, converted to the type of the column'''
+        return {
+            name: _convert(row.get(name), kind) for name, kind in self.columns
+        }
+
+    @abstractmethod
+    def _write(self, row: Dict[str, Any]) -> None:
+        '''appends a normalized row to the output'''
+
+    @abstractmethod
+    def _flush(self) -> None:
+        '''makes rows appended since the last flush durable'''
+
+
+class JsonlSink(ResultSink):
+    '''sink appends one json object per line'''
+
+    def __init__(self, settings: Settings, on_flush: Optional[Callable[[], None]] = None) -> None:
+        super().__init__(settings, on_flush)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def _flush(self) -> None:
+        self._file.flush()
+        if self.settings.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class SqliteSink(ResultSink):
+    '''
+    sink stores one row per site, a site scraped again replaces its row unless
+    the new row failed and the stored one did not
+    '''
+
+    def __init__(self, settings: Settings, on_flush: Optional[Callable[[], None]] = None) -> None:
+        super().__init__(settings, on_flush)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute(
+            f'PRAGMA synchronous = {"FULL" if settings.fsync else "NORMAL"}')
+
+        column_sql = ', '.join(
+            f'"{name}" {SQL_TYPES[kind]}' + (' PRIMARY KEY' if name == 'link' else '')
+            for name, kind in self.columns
+        )
+        self._connection.execute(f'CREATE TABLE IF NOT EXISTS results ({column_sql})')
+
+        names = ', '.join(f'"{name}"' for name, _ in self.columns)
+        placeholders = ', '.join('?' for _ in self.columns)
+        updates = ', '.join(
+            f'"{name}" = excluded."{name}"' for name, _ in self.columns if name != 'link')
+        # a failed fetch never replaces a successful row, as in deduplicate
+        self._insert_sql = (
+            f'INSERT INTO results ({names}) VALUES ({placeholders}) '
+            f'ON CONFLICT(link) DO UPDATE SET {updates} '
+            'WHERE excluded."fetch error" IS NULL OR results."fetch error" IS NOT NULL'
+        )
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self._connection.execute(self._insert_sql, [
+            json.dumps(row[name]) if kind == 'list' and row[name] is not None else row[name]
+            for name, kind in self.columns
+        ])
+
+    def _flush(self) -> None:
+        self._connection.commit()
+
+    def close(self) -> None:
+        super().close()
+        self._connection.close()
+
+
+class ParquetSink(ResultSink):
+    '''sink writes every flushed batch of rows as a new parquet part file'''
+
+    def __init__(self, settings: Settings, on_flush: Optional[Callable[[], None]] = None) -> None:
+        super().__init__(settings, on_flush)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.schema = arrow_schema(settings)
+        self._rows: List[Dict[str, Any]] = []
+        self._part = 0
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self._rows.append(row)
+
+    def _flush(self) -> None:
+        table = pa.Table.from_pylist(self._rows, schema=self.schema)
+        part_path = self.path / f'part-{os.getpid()}-{int(time.time())}-{self._part:05d}.parquet'
+        pq.write_table(table, part_path)
+        if self.settings.fsync:
+            with open(part_path, 'rb') as file:
+                os.fsync(file.fileno())
+
+        self._rows = []
+        self._part += 1
+
+
+def arrow_schema(settings: Settings) -> Any:
+    '''returns arrow schema of the output columns'''
+    arrow_types = {
+        'str': pa.string(),
+        'list': pa.list_(pa.string()),
+        'bool': pa.bool_(),
+        'int': pa.int64(),
+        'float': pa.float64(),
+    }
+    return pa.schema([
+        (name, arrow_types[kind]) for name, kind in result_columns(settings)
+    ])
+
+
+def make_sink(settings: Settings, on_flush: Optional[Callable[[], None]] = None) -> ResultSink:
+    '''creates the sink configured in the settings'''
+    sinks = {
+        'jsonl': JsonlSink,
+        'parquet': ParquetSink,
+        'sqlite': SqliteSink,
+    }
+    if settings.output_format not in sinks:
+        raise ValueError(
+            f'Unknown output format {settings.output_format}, use one of {OUTPUT_FORMATS}')
+
+    return sinks[settings.output_format](settings, on_flush)
+
+
+def read_results(settings: Settings) -> pd.DataFrame:
+    '''reads everything written by the configured sink into a dataframe'''
+    path = get_output_path(settings)
+    columns = [name for name, _ in result_columns(settings)]
+    if not path.exists() or (path.is_dir() and not any(path.glob('*.parquet'))):
+        return pd.DataFrame(columns=columns)
+
+    if settings.output_format == 'parquet':
+        return pd.read_parquet(path)
+
+    return _read_frame(path, settings)
+
+
+def read_table(path: Union[str, Path], settings: Settings) -> Any:
+    '''
+    reads a single output of any format into an arrow table
+
+    Parquet outputs are read directly into arrow, other formats go through
+    pandas. Columns are conformed to the output schema of the settings, columns
+    missing in the output are filled with nulls and unknown columns are dropped,
+    so tables of different runs can be concatenated without any copies.
+    '''
+    path = Path(path)
+    schema = arrow_schema(settings)
+    if path.is_dir() or path.suffix == '.parquet':
+        return pq.read_table(path, schema=schema)
+
+    # missing columns become typed nulls, reindexing in pandas would fill them with float nan
+    data = _read_frame(path, settings)
+    return pa.table([
+        pa.array(data[field.name], type=field.type, from_pandas=True)
+        if field.name in data else pa.nulls(len(data), field.type)
+        for field in schema
+    ], schema=schema)
+
+
+def deduplicate(table: Any) -> Any:
+    '''
+    keeps a single row per link
+
+    The last successfully fetched row of a link wins, the last row if none of
+    them was fetched successfully. Kept rows stay in their original order.
+    '''
+    table = table.filter(pc.is_valid(table['link']))
+    n_rows = len(table)
+    if not n_rows:
+        return table
+
+    # successful rows rank above all failed ones, later rows above earlier ones
+    succeeded = pc.cast(pc.is_null(table['fetch error']), pa.int64()).to_numpy()
+    rank = np.arange(n_rows) + succeeded * n_rows
+    best = pa.table({'link': table['link'], 'rank': rank}) \
+        .group_by('link').aggregate([('rank', 'max')])
+
+    return table.take(np.sort(best['rank_max'].to_numpy() % n_rows))
+
+
+def clear_output(settings: Settings) -> None:
+    '''removes everything written by the configured sink'''
+    path = get_output_path(settings)
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def export_excel(settings: Settings, path: Union[str, Path]) -> None:
+    '''exports the whole output into a single excel file'''
+    read_results(settings).to_excel(path, index=False, engine='xlsxwriter')
+
+
+def _read_frame(path: Path, settings: Settings) -> pd.DataFrame:
+    '''reads a jsonl, sqlite or legacy excel output into a dataframe'''
+    list_columns = [name for name, kind in result_columns(settings) if kind == 'list']
+
+    if path.suffix == '.sqlite':
+        with closing(sqlite3.connect(path)) as connection:
+            data = pd.read_sql('SELECT * FROM results', connection)
+        for name in list_columns:
+            if name in data:
+                data[name] = data[name].map(
+                    lambda value: json.loads(value) if isinstance(value, str) else None)
+        return data
+
+    if path.suffix in EXCEL_SUFFIXES:
+        # excel stores lists as their python representation
+        data = pd.read_excel(path)
+        for name in list_columns:
+            if name in data:
+                data[name] = data[name].map(
+                    lambda value: ast.literal_eval(value) if isinstance(value, str) else None)
+        return data
+
+    return pd.read_json(path, lines=True, dtype=False)
+
+
+def _convert(value: Any, kind: str) -> Any:
+    '''converts value to the kind of its column'''
+    if value is None:
+        return None
+
+    if kind == 'list':
+        return [str(element) for element in value]
+    if kind == 'bool':
+        return bool(value)
+    if kind == 'int':
+        return int(value)
+    if kind == 'float':
+        return float(value)
+
+    return str(value)
+
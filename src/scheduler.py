@@ -0,0 +1,190 @@
+'''
+fetch scheduler is the single place where request concurrency is limited
+'''
+
+import asyncio
+import collections
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple, Union
+
+from src.metrics import METRICS
+from src.politeness import HostPolicy
+from src.settings import Settings
+from src.url_utils import get_host
+
+# hosts whose limiter and politeness policy are kept once they are idle
+MAX_HOSTS = 4096
+
+
+class FetchScheduler():
+    '''
+    class hands out request slots to every fetch made by a worker process
+
+    The global in-flight limit is split evenly between worker processes, so the
+    sum of all process limits never exceeds it. `n_processes` is either a fixed
+    number or a shared `multiprocessing.Value` holding the number of live
+    workers, the limit then follows a pool that grows or shrinks. Slots of a host are acquired
+    before the process slot, so requests queued behind a busy host do not keep
+    process slots idle. The same holds for politeness: a request waits for its
+    host's rate limit, Crawl-delay or Retry-After pause before it takes a process
+    slot, so slow hosts never leave the process idle.
+
+    Limiters and policies of at most `MAX_HOSTS` hosts are kept, the least
+    recently used idle hosts are forgotten first. A host is idle when no request
+    holds or waits for its slot, it is not paused and its rate limit is refilled,
+    so forgetting it only means its robots.txt is fetched again if it comes back.
+    Hosts in use are never forgotten.
+    '''
+    settings: Settings
+
+    def __init__(self, settings: Settings, n_processes: Union[int, Any] = 1) -> None:
+        self.settings = settings
+        self.n_processes = n_processes
+        self._process_slots = 0
+        self._slot_waiters: Deque[asyncio.Future] = collections.deque()
+        self._hosts: 'collections.OrderedDict[str, Tuple[asyncio.Semaphore, HostPolicy]]' = \
+            collections.OrderedDict()
+        self._host_users: Dict[str, int] = collections.Counter()
+
+        self.requests = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.total_wait = 0.
+        self.max_wait = 0.
+        self.polite_wait = 0.
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        '''waits for a free slot of the url host, its rate limit and a process slot'''
+        host = get_host(url)
+        host_limiter, policy = self._get_host(host)
+        self._host_users[host] += 1
+
+        start_time = time.perf_counter()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await host_limiter.acquire()
+            try:
+                polite_wait = await policy.acquire()
+                self.polite_wait += polite_wait
+                METRICS.observe('polite_wait_seconds', polite_wait)
+                await self._acquire_process_slot()
+            except BaseException:
+                host_limiter.release()
+                self._leave_host(host)
+                raise
+        finally:
+            self.queued -= 1
+
+        wait_time = time.perf_counter() - start_time
+        self.requests += 1
+        self.total_wait += wait_time
+        self.max_wait = max(self.max_wait, wait_time)
+        METRICS.observe('slot_wait_seconds', wait_time)
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._release_process_slot()
+            host_limiter.release()
+            self._leave_host(host)
+
+    @property
+    def limit(self) -> int:
+        '''in-flight limit of the process, its share of the global limit'''
+        n_processes = getattr(self.n_processes, 'value', self.n_processes)
+        return max(1, min(
+            self.settings.max_connections_per_process,
+            self.settings.max_connections // max(1, n_processes),
+        ))
+
+    def stats(self) -> Dict:
+        '''returns queue depth and wait time statistics'''
+        return {
+            'limit': self.limit,
+            'requests': self.requests,
+            'in flight': self.in_flight,
+            'queued': self.queued,
+            'max queued': self.max_queued,
+            'mean wait': round(self.total_wait / self.requests, 3) if self.requests else 0,
+            'max wait': round(self.max_wait, 3),
+            'polite wait': round(self.polite_wait, 3),
+            'hosts': len(self._hosts),
+        }
+
+    async def _acquire_process_slot(self) -> None:
+        '''
+        waits until the process has fewer requests in flight than its limit,
+        a semaphore that reads its size from `limit` on every acquire
+        '''
+        while self._process_slots >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._slot_waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # a wake up meant for this request goes to the next one
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_slot_waiter()
+                raise
+        self._process_slots += 1
+
+    def _release_process_slot(self) -> None:
+        self._process_slots -= 1
+        self._wake_slot_waiter()
+
+    def _wake_slot_waiter(self) -> None:
+        while self._slot_waiters:
+            waiter = self._slot_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def get_policy(self, url: str) -> HostPolicy:
+        '''returns politeness policy of the url host'''
+        return self._get_host(get_host(url))[1]
+
+    def report(self, url: str, status: Optional[int], retry_after: Optional[str] = None) -> None:
+        '''lets the host policy react to the status of a finished request'''
+        self.get_policy(url).report(status, retry_after)
+
+    def _get_host(self, host: str) -> Tuple[asyncio.Semaphore, HostPolicy]:
+        '''
+        returns semaphore limiting the number of requests to a single host and
+        politeness policy of the host
+        '''
+        if host in self._hosts:
+            self._hosts.move_to_end(host)
+            return self._hosts[host]
+
+        self._evict_idle_hosts(MAX_HOSTS - 1)
+        self._hosts[host] = (
+            asyncio.Semaphore(self.settings.host_pool_sizes.get(
+                host, self.settings.max_connections_per_host)),
+            HostPolicy(
+                rate=self.settings.host_rate,
+                burst=self.settings.host_burst,
+                max_pause=self.settings.max_host_pause,
+            ),
+        )
+        return self._hosts[host]
+
+    def _leave_host(self, host: str) -> None:
+        '''a request of the host is done with its slot'''
+        self._host_users[host] -= 1
+        if not self._host_users[host]:
+            del self._host_users[host]
+
+    def _evict_idle_hosts(self, size: int) -> None:
+        '''forgets least recently used idle hosts until at most `size` are left'''
+        now = time.monotonic()
+        for host, (_, policy) in list(self._hosts.items()):
+            if len(self._hosts) <= size:
+                return
+            if host not in self._host_users and policy.is_idle(now):
+                del self._hosts[host]
@@ -1,6 +1,12 @@
 '''data class to store project settings'''
-from dataclasses import dataclass
-from typing import Dict, List
+import hashlib
+import json
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, List, Optional
+
+from src.keyword_matcher import KeywordMatcher
+from src.link_classifier import LinkClassifier
 
 
 @dataclass
@@ -11,3 +17,89 @@ class Settings():
     social_links: List[str]
     email_link_identifier: str
     phone_link_identifier: str
+    max_connections: int = 100
+    max_connections_per_host: int = 4
+    max_connections_per_process: int = 100
+    host_pool_sizes: Dict[str, int] = field(default_factory=dict)
+    keepalive_timeout: float = 30
+    dns_cache_path: Optional[str] = 'data/dns_cache.json'
+    dns_ttl: float = 3600
+    dns_negative_ttl: float = 600
+    dns_concurrency: int = 100
+    respect_robots: bool = True
+    host_rate: float = 2
+    host_burst: int = 2
+    max_crawl_delay: float = 10
+    max_host_pause: float = 60
+    connect_timeout: float = 10
+    read_timeout: float = 20
+    max_body_size_mb: float = 5
+    content_types: List[str] = field(
+        default_factory=lambda: ['text/html', 'application/xhtml+xml', 'text/plain'])
+    site_group_deadline: float = 120
+    max_depth: int = 1
+    max_pages_per_site: int = 20
+    max_site_text: int = 10000
+    link_priorities: List[str] = field(
+        default_factory=lambda: ['about', 'contact', 'service', 'team', 'location'])
+    max_retries: int = 2
+    retry_backoff: float = 0.5
+    retry_backoff_max: float = 8
+    n_workers: Optional[int] = None
+    max_workers: Optional[int] = None
+    sites_per_worker: int = 20
+    max_cpu_load: float = 0.8
+    max_network_load: float = 0.8
+    coordinator_address: str = '127.0.0.1:8950'
+    coordinator_authkey: Optional[str] = None
+    lease_size: int = 20
+    lease_timeout: float = 300
+    max_lease_attempts: int = 3
+    output_format: str = 'jsonl'
+    output_path: str = 'data/scraped_data'
+    flush_every: int = 50
+    flush_interval: float = 30
+    fsync: bool = True
+    export_excel: bool = False
+    journal_path: Optional[str] = 'data/crawl_journal.db'
+    metrics_path: Optional[str] = 'data/metrics'
+    metrics_interval: float = 30
+    profile: bool = False
+    cache_path: Optional[str] = None
+    cache_ttl: float = 86400
+    cache_max_size_mb: int = 2048
+    offline: bool = False
+    keyword_word_boundary: bool = False
+    keyword_ignore_whitespace: bool = True
+    html_parser: str = 'stream'
+
+    @cached_property
+    def keyword_matcher(self) -> KeywordMatcher:
+        '''matcher of all key words, compiled once per settings object'''
+        return KeywordMatcher(
+            self.key_words,
+            word_boundary=self.keyword_word_boundary,
+            ignore_whitespace=self.keyword_ignore_whitespace,
+        )
+
+    @cached_property
+    def link_classifier(self) -> LinkClassifier:
+        '''classifier of page links, compiled once per settings object'''
+        return LinkClassifier(
+            self.phone_link_identifier,
+            self.email_link_identifier,
+            self.social_links,
+        )
+
+    @cached_property
+    def extraction_key(self) -> str:
+        '''
+        hash of the settings that shape what is extracted from a page, pages
+        extracted with other settings have to be extracted again
+        '''
+        fields = (
+            self.key_words, self.social_links, self.email_link_identifier,
+            self.phone_link_identifier, self.keyword_word_boundary,
+            self.keyword_ignore_whitespace, self.html_parser,
+        )
+        return hashlib.sha256(json.dumps(fields).encode('utf-8')).hexdigest()[:16]
@@ -1,255 +1,271 @@
 '''module for Site class'''
 
-import re
-from functools import cache
-from threading import Thread
-from typing import Any, Dict, List, Union
-
-import bs4
+import asyncio
+import hashlib
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Union
 
 import src.parsing_utils as pu
-from src.request_utils import (check_link, convert_content_into_soup,
-                               get_page_content)
+from src.crawl_journal import CrawlJournal, PageVersion
+from src.fetch_engine import FetchEngine
+from src.html_extract import PageContent, extract_page
+from src.link_classifier import LinkBuckets
+from src.metrics import METRICS
+from src.request_utils import FetchResult, check_link
 from src.settings import Settings
+from src.site_accumulator import SiteAccumulator
+from src.site_record import SiteRecord
+
+FETCH_KEYS = ('fetch status', 'fetch error', 'fetch time')
 
 
-class Site(Thread):
+class Site():
     '''class is responsible to fetching and parsing single page content'''
     link: str
     settings: Settings
     site_content: str
-    return_dict: dict
+    fetch_result: FetchResult
+    record: SiteRecord
     check_children = False
-
-    def __init__(
-        self,
-        group=None,
-        target=None,
-        threadLimiter=None,
-        **kwargs
-    ) -> None:
-        super().__init__(group=group, target=target, name=kwargs.get('link'))
-
-        self.thread_limiter = threadLimiter
+    journal: Optional[CrawlJournal] = None
+
+    def __init__(self, **kwargs) -> None:
+        self.site_content = None  # type: ignore
+        self.fetch_result = None  # type: ignore
+        self.record = None  # type: ignore
+        self.previous: Optional[PageVersion] = None
+        self.content_hash: Optional[str] = None
+        self.carried_forward = False
         self.__dict__.update(kwargs)
+        self.name = kwargs.get('link')
 
         if self.link:
             self.link = check_link(self.link)
 
-    def fetch_site_content(self) -> None:
-        '''fetch page content'''
+    async def fetch_site_content(
+        self,
+        engine: FetchEngine,
+        deadline: Optional[float] = None
+    ) -> None:
+        '''
+        fetch page content, with the validators of the version of the page
+        stored in the journal if there is one
+        '''
+        if self.journal:
+            self.previous = self.journal.get_version(self.link, self.settings.extraction_key)
+
+        self.fetch_result = await engine.get_page_content(
+            self.link,
+            deadline,
+            validators=self.previous.conditional_headers() if self.previous else None,
+        )
+        self.site_content = self.fetch_result.content  # type: ignore
 
-        self.site_content = get_page_content(
-            self.link, self.settings.header)  # type: ignore
+    async def run(self, engine: FetchEngine, deadline: Optional[float] = None) -> None:
+        '''
+        fetches the page through the engine and extracts its information
 
-    def run(self):
-        """function that is called whenever the thread is started"""
-        if self.thread_limiter:
-            self.thread_limiter.acquire()
+        A page that did not change since its stored version, because the server
+        answered 304 or the content has the same hash, is not parsed again, the
+        stored dictionary is carried forward. A cancelled page is not extracted
+        at all, it was cancelled because its result is no longer needed.
+        '''
         try:
-            self.fetch_site_content()
+            await self.fetch_site_content(engine, deadline)
+        except asyncio.CancelledError:
+            self._release_content()
+            raise
         except Exception as err:
+            METRICS.inc('page_errors_total', error=type(err).__name__)
             print(
                 f'Could not parse {self.name} due to the following error: {err}')
-        finally:
+
+        if self.site_content:
+            self.content_hash = hashlib.blake2b(
+                self.site_content.encode('utf-8'), digest_size=16).hexdigest()
+        if self._is_unchanged():
+            self._carry_forward()
+        else:
             self.return_dict = self.to_dict()
-            if self.thread_limiter:
-                self.thread_limiter.release()
+
+    @property
+    def return_dict(self) -> Dict:
+        '''dictionary representation of the extracted information'''
+        return self.record.to_dict(self.settings)
+
+    @return_dict.setter
+    def return_dict(self, data: Dict) -> None:
+        self.record = SiteRecord.from_dict(data, self.settings)
 
     def to_dict(self):
-        '''prepares a dictionary with all scraped information frm the web site'''
-        self.return_dict = {
-            'link': self.link,
-            **self._get_name(),
-            **self._get_address(),
-            **self._get_phones(),
-            **self._get_emails(),
-            **self._get_social(),
-            **self._get_keywords(),
-            **self._get_page_text(),
-            **self._get_self_links(),
-        }
-        return self.return_dict
+        '''
+        prepares a dictionary with all scraped information frm the web site
+
+        Only the compact record is kept afterwards, the page content and
+        everything parsed from it are released. The page is parsed once for all
+        extractors, parsing and every extractor are timed in the metrics.
+        '''
+        with METRICS.timer('parse_seconds', parser=self.settings.html_parser):
+            _ = self.page, self.links
+
+        return_dict = {'link': self.link}
+        for extractor in (
+            self._get_name,
+            self._get_address,
+            self._get_phones,
+            self._get_emails,
+            self._get_social,
+            self._get_keywords,
+            self._get_page_text,
+            self._get_self_links,
+            self._get_fetch_info,
+        ):
+            with METRICS.timer('extract_seconds', extractor=extractor.__name__.removeprefix('_get_')):
+                return_dict.update(extractor())
+        self.return_dict = return_dict
+        self._save_version(return_dict)
+        self._release_content()
+        return return_dict
+
+    def _is_unchanged(self) -> bool:
+        '''whether the page is the same as its stored version'''
+        if not self.previous or not self.fetch_result or self.fetch_result.error:
+            return False
+
+        if self.fetch_result.status == 304 and self.fetch_result.content is None:
+            return True
+
+        return self.content_hash == self.previous.content_hash
+
+    def _carry_forward(self) -> None:
+        '''takes the record of the stored version, with fetch information of this run'''
+        METRICS.inc('pages_carried_forward_total')
+        self.carried_forward = True
+        record = SiteRecord.from_dict(self.previous.record, self.settings)  # type: ignore
+        record.next_links = self.self_links
+        record.fetch_status = self.previous.status  # type: ignore
+        record.fetch_error = None
+        record.fetch_time = round(self.fetch_result.elapsed, 3)
+        self.record = record
+        self._release_content()
+
+    def _save_version(self, return_dict: Dict) -> None:
+        '''stores hash, validators and dictionary of a successfully fetched page'''
+        if not self.journal or not self.content_hash or self.fetch_result.error:
+            return
+
+        self.journal.put_version(PageVersion(
+            url=self.link,
+            etag=self.fetch_result.headers.get('ETag'),
+            last_modified=self.fetch_result.headers.get('Last-Modified'),
+            content_hash=self.content_hash,
+            settings_key=self.settings.extraction_key,
+            status=self.fetch_result.status,
+            record=return_dict,
+            self_links=sorted(self.link_buckets.self_links) if self.link_buckets else [],
+        ))
+
+    def _release_content(self) -> None:
+        '''drops raw html and parsed page, which are not needed after extraction'''
+        self.site_content = None  # type: ignore
+        if self.fetch_result:
+            self.fetch_result.content = None
+        for name in ('page', 'link_buckets'):
+            self.__dict__.pop(name, None)
 
     def __add__(self, other):
-        '''method for mergin information from two sites'''
-        # if not other:
-        #     return self
-
-        dict_a = self.return_dict
-        dict_b = other.return_dict
-        updated_dict = {}
-        for key in dict_a.keys():
-            if key == 'name':
-                update_element = None
-            elif key in self.settings.key_words:
-                update_element = combine(
-                    dict_a.get(key, False),
-                    dict_b.get(key, False),
-                    _max,
-                )
-            elif key == 'site_text':
-                update_element = combine(
-                    dict_a.get(key, ''),
-                    dict_b.get(key, ''),
-                    _concat,
-                )
-            elif key == 'next level links':
-                update_element = dict_a.get(key)
-            elif key == 'link':
-                update_element = dict_a.get(key)
-            elif key == 'address':
-                update_element = combine(
-                    dict_a.get(key, ''),
-                    dict_b.get(key, ''),
-                    _concat,
-                )
-            else:
-                update_element = combine(
-                    dict_a.get(key, []),
-                    dict_b.get(key, []),
-                    _common,
-                )
-
-            updated_dict.update({key: update_element})
-
-        self.return_dict = updated_dict
+        '''
+        method for merging information from two sites, the result keeps link
+        and fetch information of the first site
+        '''
+        accumulator = SiteAccumulator(self.link, self.settings)
+        accumulator.add(self.record)
+        accumulator.add(other.record)
+        self.record = accumulator.to_record()
         return self
 
-    @property
-    @cache
-    def site_soup(self) -> Union[bs4.BeautifulSoup, Any]:
-        '''convert site content into bs4 soup'''
+    @cached_property
+    def page(self) -> Union[PageContent, Any]:
+        '''links, text and address extracted from the site content'''
         if not self.site_content:
             return None
 
-        return convert_content_into_soup(self.site_content)
+        return extract_page(self.site_content, self.settings.html_parser)
 
-    @property
-    @cache
-    def links(self) -> Union[List[str], Any]:
-        '''list of links found on the web site'''
-        if not self.site_soup:
-            return None
-
-        found_links = pu.get_links(self.site_soup)
-        if not found_links:
+    @cached_property
+    def link_buckets(self) -> Union[LinkBuckets, Any]:
+        '''links of the page sorted into phones, emails, social and page links in one pass'''
+        if not self.page or not self.page.links:
             return None
 
-        found_links = [
-            self.link + link
-            if link[0] == '/' else link
-            for link in found_links
-        ]
-        found_links = list(
-            set(
-                re.sub(r'www\.', '', link)
-                for link in found_links
-            )
-        )
-
-        found_links = [link for link in found_links if link != self.link]
-        return found_links
+        return self.settings.link_classifier.classify(self.page.links, self.link)
 
     @property
-    @cache
-    def self_links(self):
-        '''returns a list of links to the same web site'''
-
-        if not self.links:
-            return None
+    def links(self) -> Union[List[str], Any]:
+        '''
+        list of links found on the web site
 
-        if not self.check_children:
+        Web links are resolved against the page link and canonicalized, other
+        links like `mailto:` or `tel:` are kept as they are.
+        '''
+        if not self.link_buckets:
             return None
 
-        # check short links, the ones that start with / symbol
-        short_links = pu.check_specific_links(self.links, "/", False)
-        link = self.link[:-1] if self.link[-1] == '/' else self.link
-        short_links = [link + short_link for short_link in short_links]
-
-        # check long linksm the ones that contain the original link
-        long_links = pu.check_specific_links(self.links, self.link, False)
-
-        link_list = short_links + long_links
-
-        def clean_link(link: str) -> str:
-            link = re.sub(r'https://', 'qwerty', link)
-            link = re.sub(r'//', '/', link)
-            link = re.sub('qwerty', 'https://', link)
-            return link
-
-        link_list = list(
-            set(
-                map(clean_link, link_list)
-            )
-        )
+        return self.link_buckets.links or None
 
-        def select_first_level_links(link_list, self_link=self.link) -> List[str] | None:
-            '''function removes second level links fromt he link list'''
+    @cached_property
+    def self_links(self) -> Union[List[str], Any]:
+        '''
+        returns sorted list of pages of the same web site linked from the page
 
-            clean_links = []
-            for link in link_list:
-                clean_link = re.sub(r'\?.+', '', link)
-                clean_link = clean_link if clean_link[-1] != '/' else clean_link[-1]
-                remainder = re.sub(self_link, '', clean_link)
-                if not re.match(r'\/', remainder):
-                    clean_links.append(clean_link)
-
-            if not clean_links:
-                return None
+        Query parameters are dropped, so pages that differ only in their query
+        are fetched once. Links to documents, images and other files are skipped.
+        Pages carried forward take them from their stored version.
+        '''
+        if not self.check_children:
+            return None
 
-            return list(set(clean_links))
+        if self.previous and self.carried_forward:
+            return self.previous.self_links or None
 
-        link_list = select_first_level_links(link_list, self.link)
-        if not link_list:
+        if not self.links:
             return None
 
-        return link_list
+        return sorted(self.link_buckets.self_links) or None
 
     def _get_self_links(self):
         '''temporary function'''
 
         return {'next level links': self.self_links}
 
+    def _get_fetch_info(self) -> Dict:
+        '''return dictionary describing how the page request went'''
+        if not self.fetch_result:
+            return {key: None for key in FETCH_KEYS}
+
+        return dict(zip(FETCH_KEYS, (
+            self.fetch_result.status,
+            self.fetch_result.error,
+            round(self.fetch_result.elapsed, 3),
+        )))
+
     def _get_name(self) -> Dict:
         '''return dictionary with company names'''
         return {'name': None}
 
     def _get_address(self) -> Dict:
         '''return dictionary with addresses'''
-        soup = self.site_soup
-        if not soup:
+        if not self.page:
             return {'address': None}
 
-        def custom_tag_selector(tag):
-            tag_match = re.search(r'a|h\d|div|span', tag.name) is not None
-            text_match = re.search('^address', tag.text.lower()) is not None
-            return tag_match & text_match
-
-        address_element = soup.find(custom_tag_selector)
-        if not address_element:
-            return {'address': None}
-
-        return {'address': address_element.text}
+        return {'address': self.page.address}
 
     def _get_phones(self) -> Dict:
         '''get phone links from the page'''
         if not self.links:
             return {'found phones': None}
 
-        found_phones = pu.check_specific_links(
-            link_list=self.links,
-            link_type=self.settings.phone_link_identifier,
-            clean_links=True,
-        )
-
-        found_phones = [
-            re.sub(r'\D', '', phone)
-            for phone in found_phones
-        ]
-        found_phones = list(set(found_phones))
-
-        return {'found phones': found_phones}
+        return {'found phones': self.link_buckets.phones}
 
     def _get_emails(self) -> Dict:
         '''get email links from the page'''
@@ -257,65 +273,31 @@ class Site(Thread):
         if not self.links:
             return {'found emails': None}
 
-        found_emails = pu.check_specific_links(
-            link_list=self.links,
-            link_type=self.settings.email_link_identifier,
-            clean_links=True,
-        )
-
-        return {'found emails': found_emails}
+        return {'found emails': self.link_buckets.emails}
 
     def _get_social(self) -> Dict:
         '''checks presents of social link accounts'''
 
-        return pu.check_social_mdeia(self.links, self.settings.social_links)
+        if not self.links:
+            return {social: None for social in self.settings.social_links}
+
+        return dict(zip(self.settings.social_links, self.link_buckets.social))
 
     def _get_keywords(self) -> Dict:
         '''checks precence of keywords on the page'''
 
-        return pu.check_keywords(self.site_content, self.settings.key_words)
+        if not self.page:
+            return pu.check_keywords('', self.settings.keyword_matcher)
+
+        return pu.check_keywords(self.page.visible_text, self.settings.keyword_matcher)
 
     def _get_page_text(self) -> Dict:
         '''returns cleaned text from the page'''
 
-        if not self.site_soup:
+        if not self.page:
             return {'site_text': None}
 
-        page_text = pu.get_main_page_text(self.site_soup)  # type: ignore
+        page_text = pu.get_main_page_text(self.page.text) or ''
         return {
             'site_text': f'page: {self.link}\n{page_text[:min(1000, len(page_text))]}'
         }
-
-
-def combine(el_a, el_b, combination_function):
-    """
-    Concatenation of two lists, handling `None` values.
-
-    Args:
-    el_a: The first list.
-    el_b: The second list.
-    combination_function callable to collect results
-
-    Returns:
-    The concatenation of the two lists, with unique elements.
-    """
-
-    if el_a is None:
-        return el_b
-
-    if el_b is None:
-        return el_a
-
-    return combination_function(el_a, el_b)
-
-
-def _concat(el_a, el_b):
-    return f'{el_a}\n{el_b}'
-
-
-def _max(el_a, el_b):
-    return max(el_a, el_b)
-
-
-def _common(el_a, el_b):
-    list(set(el_a + el_b))
@@ -0,0 +1,136 @@
+'''
+site accumulator merges results of the pages of a site one page at a time,
+so a site group does not have to hold its pages until the crawl is done
+'''
+
+from typing import Dict, List, Optional, Set
+
+from src.settings import Settings
+from src.site_record import SiteRecord
+
+TEXT_SEPARATOR = '\n'
+
+
+class SiteAccumulator():
+    '''
+    class merges records of the pages of a site in place as they arrive
+
+    Phones, emails and social links of all pages are collected into sets that
+    keep the order in which values were found, keywords are combined with a
+    boolean or. Addresses and page texts are appended to buffers, page texts
+    only until the buffer holds `max_site_text` characters. Link, fetch
+    information and next level links are those of the first page, the main page
+    of the site. A field stays None while none of the pages had a value for it.
+    '''
+    settings: Settings
+
+    def __init__(self, link: str, settings: Settings) -> None:
+        self.link = link
+        self.settings = settings
+        self.n_pages = 0
+        self._first: Optional[SiteRecord] = None
+        self._phones: Optional[Dict[str, None]] = None
+        self._emails: Optional[Dict[str, None]] = None
+        self._social: List[Optional[Dict[str, None]]] = [None] * len(settings.social_links)
+        self._keywords: List[Optional[bool]] = [None] * len(settings.key_words)
+        self._addresses: Optional[Dict[str, None]] = None
+        self._texts: List[str] = []
+        self._text_size = 0
+
+    @property
+    def open_fields(self) -> Set[str]:
+        '''
+        returns fields whose merged value another page could still change
+
+        Keywords are settled once they are True, phones, emails and social links
+        once they are not empty. Address and text always grow and do not keep
+        a site open.
+        '''
+        open_fields = {
+            name for name, values in (
+                ('found phones', self._phones),
+                ('found emails', self._emails),
+                *zip(self.settings.social_links, self._social),
+            )
+            if not values
+        }
+        open_fields.update(
+            keyword for keyword, found in zip(self.settings.key_words, self._keywords)
+            if not found
+        )
+        return open_fields
+
+    @property
+    def saturated(self) -> bool:
+        '''whether no further page could change the merged result'''
+        return not self.open_fields
+
+    def add(self, record: SiteRecord) -> None:
+        '''merges record of a single page'''
+        if self._first is None:
+            self._first = record
+        self.n_pages += 1
+
+        self._phones = _union(self._phones, record.phones)
+        self._emails = _union(self._emails, record.emails)
+        for idx, values in enumerate(record.social):
+            self._social[idx] = _union(self._social[idx], values)
+        for idx, found in enumerate(record.keywords):
+            if found is not None:
+                self._keywords[idx] = bool(self._keywords[idx]) or bool(found)
+
+        if record.address:
+            self._addresses = _union(self._addresses, [record.address])
+        if record.site_text:
+            self._add_text(record.site_text)
+
+    def to_record(self) -> SiteRecord:
+        '''returns merged record of the whole site'''
+        first = self._first or SiteRecord(link=self.link)
+        return SiteRecord(
+            link=self.link,
+            address=_join(self._addresses),
+            phones=_to_list(self._phones),
+            emails=_to_list(self._emails),
+            social=tuple(_to_list(values) for values in self._social),
+            keywords=tuple(self._keywords),
+            site_text=TEXT_SEPARATOR.join(self._texts) if self._texts else None,
+            next_links=first.next_links,
+            fetch_status=first.fetch_status,
+            fetch_error=first.fetch_error,
+            fetch_time=first.fetch_time,
+        )
+
+    def _add_text(self, text: str) -> None:
+        '''appends page text as long as the buffer has room for it'''
+        room = self.settings.max_site_text - self._text_size
+        if room <= 0:
+            return
+
+        text = text[:room]
+        self._texts.append(text)
+        self._text_size += len(text) + len(TEXT_SEPARATOR)
+
+
+def _union(
+    values: Optional[Dict[str, None]],
+    new_values: Optional[List[str]],
+) -> Optional[Dict[str, None]]:
+    '''adds new values to an ordered set, keeps None if there is nothing to add'''
+    if new_values is None:
+        return values
+
+    if values is None:
+        values = {}
+    values.update(dict.fromkeys(new_values))
+    return values
+
+
+def _to_list(values: Optional[Dict[str, None]]) -> Optional[List[str]]:
+    '''returns values of an ordered set as a list'''
+    return None if values is None else list(values)
+
+
+def _join(values: Optional[Dict[str, None]]) -> Optional[str]:
+    '''returns values of an ordered set joined into a single text'''
+    return None if values is None else TEXT_SEPARATOR.join(values)
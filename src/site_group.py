@@ -3,74 +3,147 @@ site group is a group of sites made to scrape top level site
 as well as all self links inside this web site
 '''
 
-import queue
-from threading import Thread
-from typing import Dict, List
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
 
 import src.request_utils as ru
+from src.crawl_journal import DONE, FAILED, IN_FLIGHT, PENDING, CrawlJournal
+from src.fetch_engine import FetchEngine
 from src.settings import Settings
 from src.site import Site
+from src.site_accumulator import SiteAccumulator
+from src.site_record import SiteRecord
+from src.url_utils import get_path_depth
 
 
-class SiteGroup(Thread):
+class SiteGroup():
     '''class handles the whole site'''
     link: str
     settings: Settings
     main_page: Site
-    children: List[Site]
-    combined_dict: Dict
+    record: SiteRecord
+    journal: Optional[CrawlJournal] = None
 
-    def __init__(
-        self,
-        group=None,
-        target=None,
-        threadLimiter=None,
-        **kwargs
-    ) -> None:
+    def __init__(self, **kwargs) -> None:
         self.__dict__.update(kwargs)
         if self.link:
             self.link = ru.check_link(self.link)
 
-        super().__init__(group, target, name=kwargs.get('link'))
-        self.queue = queue.Queue()
-        self.thread_limiter = threadLimiter
-
-    def run(self):
-        '''method is called when the thread is initialized'''
+        self.name = kwargs.get('link')
+        self.record = None  # type: ignore
+        self._accumulator: Union[SiteAccumulator, Any] = None
+
+    @property
+    def combined_dict(self) -> Dict:
+        '''dictionary with information combined from all pages of the site'''
+        return self.record.to_dict(self.settings)
+
+    async def run(self, engine: FetchEngine) -> None:
+        '''
+        crawls the site breadth first, starting from the main page
+
+        Links of the next level are ranked by `link_priorities` and pages
+        already seen during the run are skipped. Pages of a level are fetched
+        concurrently in the order of their priority and merged into the site
+        result in that order, each page is released once merged. Pending
+        fetches are cancelled as soon as no further page could change the
+        combined result. The crawl stops after `max_depth` levels or after
+        `max_pages_per_site` pages. All requests of the group share one deadline,
+        pages that could not be fetched in time are reported with a deadline error.
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.settings.site_group_deadline
+        self._accumulator = SiteAccumulator(self.link, self.settings)
         self._set_main_site()
-        self.main_page.start()
-        self.main_page.join()
-
-        self._set_children()
-        if self.children:
-            child_threads = []
-            for child_page in self.children:
-                child_thread = Thread(
-                    target=self._fetch_child_page,
-                    args=(child_page,)
-                )
-                child_thread.start()
-                child_threads.append(child_thread)
-
-            self.main_page.join()
-
-            # Wait for all child threads to finish.
-            for child_thread in child_threads:
-                child_thread.join()
+        engine.frontier.add(self.link)
+        await self._run_page(self.main_page, engine, deadline)
+        self._accumulator.add(self.main_page.record)
 
-        self._combine_results()
+        links = self.main_page.self_links or []
+        budget = self.settings.max_pages_per_site - 1
+        for depth in range(1, self.settings.max_depth + 1):
+            if budget <= 0 or loop.time() >= deadline or self._accumulator.saturated:
+                break
 
-    def _combine_results(self) -> None:
-        '''function combines all return dictionaries'''
-        combined_site = self.main_page
-        if not self.children:
-            self.combined_dict = self.main_page.return_dict
-            return
+            level = self._set_children(links, depth, budget, engine)
+            if not level:
+                break
 
-        for child in self.children:
-            combied_site = combined_site + child
+            budget -= len(level)
+            links = await self._run_level(level, engine, deadline)
 
-        self.combined_dict = combied_site.return_dict  # type: ignore
+        self._combine_results()
+
+    async def _run_level(
+        self,
+        pages: List[Site],
+        engine: FetchEngine,
+        deadline: float,
+    ) -> List[str]:
+        '''
+        runs pages of a level, returns links of the next level found on them
+
+        Tasks are created in priority order, so the scheduler hands out slots
+        to the most promising pages first. Pages are merged in that order too,
+        a finished page waits until all pages before it are merged, so the
+        combined result does not depend on which response came first. Pages
+        that raised or have no record are skipped. Links of the next level keep
+        the order of the pages they were found on. Pages not merged yet are
+        cancelled however the level ends, also when the site itself is cancelled.
+        '''
+        tasks = [
+            asyncio.create_task(self._run_page(page, engine, deadline))
+            for page in pages
+        ]
+        next_links: List[str] = []
+        merged = 0
+        pending = set(tasks)
+        try:
+            while merged < len(tasks) and not self._accumulator.saturated:
+                if not tasks[merged].done():
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                page, task = pages[merged], tasks[merged]
+                merged += 1
+                if task.exception():
+                    print(f'Could not scrape page {page.link} due to the following error: '
+                          f'{task.exception()}')
+                    continue
+                if page.record is None:
+                    continue
+                self._accumulator.add(page.record)
+                next_links.extend(page.self_links or [])
+        finally:
+            for task in tasks[merged:]:
+                task.cancel()
+            await asyncio.gather(*tasks[merged:], return_exceptions=True)
+
+        return next_links
+
+    async def _run_page(self, page: Site, engine: FetchEngine, deadline: float) -> None:
+        '''runs a single page, recording its state in the journal if there is one'''
+        if self.journal:
+            self.journal.update_page(self.link, page.link, IN_FLIGHT)
+
+        try:
+            await page.run(engine, deadline)
+        except asyncio.CancelledError:
+            if self.journal:
+                self.journal.update_page(self.link, page.link, PENDING, 'cancelled')
+            raise
+
+        if self.journal:
+            error = page.fetch_result.error if page.fetch_result else 'not fetched'
+            retryable = bool(page.fetch_result and page.fetch_result.retryable)
+            self.journal.update_page(
+                self.link, page.link, FAILED if error else DONE, error, retryable)
+
+    def _combine_results(self) -> None:
+        '''function stores the record combined from all pages'''
+        self.record = self._accumulator.to_record()
+        self._accumulator = None
 
     def _set_main_site(self) -> None:
         '''function parses the main page'''
@@ -78,34 +151,50 @@ class SiteGroup(Thread):
         self.main_page = Site(
             link=self.link,
             settings=self.settings,
-            group=None,  # type: ignore
-            target=None,  # type: ignore
-            thread_limiter=self.thread_limiter,  # type: ignore
+            check_children=self.settings.max_depth > 0,
+            journal=self.journal,
         )
 
-    def _set_children(self) -> None:
-        '''function fetches and parses child pages of the main site'''
-
-        child_links = self.main_page.self_links
-        if not child_links:
-            self.children = None  # type: ignore
-            return
+    def _set_children(
+        self,
+        links: List[str],
+        depth: int,
+        budget: int,
+        engine: FetchEngine,
+    ) -> List[Site]:
+        '''
+        function returns pages of the next level, the ones with the highest
+        priority first. Pages already seen during the run or disallowed by the
+        robots.txt of the site are skipped
+        '''
+        child_links = [
+            link for link in dict.fromkeys(links)
+            if link not in engine.frontier and engine.is_allowed(link)
+        ]
+        child_links = sorted(
+            child_links,
+            key=lambda link: get_link_priority(link, self.settings.link_priorities),
+        )[:budget]
 
-        child_sites = [
+        return [
             Site(
                 link=link,
                 settings=self.settings,
-                group=None,  # type: ignore
-                target=None,  # type: ignore
-                thread_limiter=self.thread_limiter,  # type: ignore
-                check_children=False,
+                check_children=depth < self.settings.max_depth,
+                journal=self.journal,
             )
-            for link in child_links
+            for link in engine.frontier.filter(child_links)
         ]
 
-        self.children = child_sites
 
-    def _fetch_child_page(self, child_page):
-        child_page.start()
-        child_page.join()
-        self.queue.put(child_page.return_dict)
+def get_link_priority(link: str, priorities: List[str]) -> Tuple[int, int, str]:
+    '''
+    returns sort key of a link, links containing words listed earlier in
+    priorities come first, then shallower links
+    '''
+    path = urlsplit(link).path.lower()
+    rank = next(
+        (idx for idx, word in enumerate(priorities) if word.lower() in path),
+        len(priorities),
+    )
+    return rank, get_path_depth(link), link
@@ -0,0 +1,67 @@
+'''compact record of the information scraped from a page or a whole site'''
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.settings import Settings
+
+
+@dataclass(slots=True)
+class SiteRecord():
+    '''
+    class stores only the extracted fields of a site
+
+    Social links and keyword flags are kept as tuples in the order of the
+    project settings, so a record does not repeat the column names.
+    '''
+    link: str
+    name: Optional[str] = None
+    address: Optional[str] = None
+    phones: Optional[List[str]] = None
+    emails: Optional[List[str]] = None
+    social: Tuple[Optional[List[str]], ...] = ()
+    keywords: Tuple[Optional[bool], ...] = ()
+    site_text: Optional[str] = None
+    next_links: Optional[List[str]] = None
+    fetch_status: Optional[int] = None
+    fetch_error: Optional[str] = None
+    fetch_time: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], settings: Settings) -> 'SiteRecord':
+        '''creates record from the dictionary representation of a site'''
+        return cls(
+            link=data['link'],
+            name=data.get('name'),
+            address=data.get('address'),
+            phones=data.get('found phones'),
+            emails=data.get('found emails'),
+            social=tuple(data.get(social) for social in settings.social_links),
+            keywords=tuple(data.get(keyword) for keyword in settings.key_words),
+            site_text=data.get('site_text'),
+            next_links=data.get('next level links'),
+            fetch_status=data.get('fetch status'),
+            fetch_error=data.get('fetch error'),
+            fetch_time=data.get('fetch time'),
+        )
+
+    def to_dict(self, settings: Settings) -> Dict[str, Any]:
+        '''returns dictionary representation used in the output files'''
+        return {
+            'link': self.link,
+            'name': self.name,
+            'address': self.address,
+            'found phones': self.phones,
+            'found emails': self.emails,
+            **dict(zip(settings.social_links, self.social or _nones(settings.social_links))),
+            **dict(zip(settings.key_words, self.keywords or _nones(settings.key_words))),
+            'site_text': self.site_text,
+            'next level links': self.next_links,
+            'fetch status': self.fetch_status,
+            'fetch error': self.fetch_error,
+            'fetch time': self.fetch_time,
+        }
+
+
+def _nones(keys: List[str]) -> Tuple[None, ...]:
+    '''returns a tuple of None values of the same length as the keys'''
+    return (None,) * len(keys)
@@ -0,0 +1,161 @@
+'''
+url canonicalization and the frontier of pages seen during a run, so the same
+page spelled in different ways is fetched and reported only once
+'''
+
+import hashlib
+import re
+from typing import Any, Iterable, List, Set, Union
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urljoin, urlsplit, urlunsplit
+
+DEFAULT_SCHEME = 'https'
+WEB_SCHEMES = ('http', 'https')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# query parameters that only track where a visitor came from
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid')
+# characters left unescaped in path segments, `%` keeps existing escapes intact
+PATH_SAFE = "%:@!$&'()*+,;=-._~"
+SCHEME_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+
+def canonicalize_url(
+    url: str,
+    base: Union[str, Any] = None,
+    keep_query: bool = True,
+) -> Union[str, Any]:
+    '''
+    returns canonical form of a web link, None if it is not a web link
+
+    Relative links are resolved against the base. Scheme and host are lower
+    case, `www.` and default ports are removed, links without a scheme get
+    https. Duplicate slashes and dot segments are removed from the path, which
+    has no trailing slash unless it is the root. Tracking parameters are
+    removed and the query is sorted, fragments are dropped.
+
+    Args:
+        url: link as found in the site list or on a page
+        base: link of the page the url was found on
+        keep_query: whether query parameters are part of the link
+    '''
+    url = url.strip() if url else ''
+    if not url:
+        return None
+
+    if base:
+        url = urljoin(base, url)
+    elif url.startswith('//'):
+        url = f'{DEFAULT_SCHEME}:{url}'
+    elif not _has_scheme(url):
+        # bare host names like example.com or example.com:8080/path
+        url = f'{DEFAULT_SCHEME}://{url}'
+
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    host = get_host(url)
+    if scheme not in WEB_SCHEMES or not host:
+        return None
+
+    netloc = host
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f'{host}:{port}'
+
+    return urlunsplit((
+        scheme,
+        netloc,
+        _normalize_path(parts.path),
+        _normalize_query(parts.query) if keep_query else '',
+        '',
+    ))
+
+
+def get_host(url: str) -> str:
+    '''returns lower case host name of the url without www prefix'''
+    try:
+        host = urlsplit(url).hostname or ''
+    except ValueError:
+        return ''
+
+    return re.sub(r'^www\.', '', host)
+
+
+def get_path_depth(url: str) -> int:
+    '''returns number of path segments of the url, 0 for the root page'''
+    return len([segment for segment in urlsplit(url).path.split('/') if segment])
+
+
+def _has_scheme(url: str) -> bool:
+    '''checks whether the url starts with a scheme rather than a host and port'''
+    match = SCHEME_PATTERN.match(url)
+    if not match:
+        return False
+
+    scheme = match.group()[:-1].lower()
+    return '.' not in scheme and scheme != 'localhost'
+
+
+def _normalize_path(path: str) -> str:
+    '''removes dot segments, duplicate and trailing slashes, normalizes escapes'''
+    segments: List[str] = []
+    for segment in path.split('/'):
+        if segment in ('', '.'):
+            continue
+        if segment == '..':
+            if segments:
+                segments.pop()
+            continue
+        segments.append(quote(unquote(segment), safe=PATH_SAFE))
+
+    return '/' + '/'.join(segments)
+
+
+def _normalize_query(query: str) -> str:
+    '''removes tracking parameters and sorts the rest'''
+    params = [
+        (key, value) for key, value in parse_qsl(query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    ]
+    return urlencode(sorted(params))
+
+
+class UrlFrontier():
+    '''
+    class remembers every page seen during a run of a worker process
+
+    Only a 64 bit hash of each canonical link is stored, which takes a fraction
+    of the memory of the link itself. Links are canonicalized before hashing, so
+    different spellings of a page count as the same page.
+    '''
+
+    def __init__(self) -> None:
+        self._seen: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, url: str) -> bool:
+        return self._hash(url) in self._seen
+
+    def add(self, url: str) -> bool:
+        '''marks the page as seen, returns whether it was not seen before'''
+        key = self._hash(url)
+        if key in self._seen:
+            return False
+
+        self._seen.add(key)
+        return True
+
+    def filter(self, urls: Iterable[str]) -> List[str]:
+        '''marks pages as seen, returns those that were not seen before'''
+        return [url for url in urls if self.add(url)]
+
+    @staticmethod
+    def _hash(url: str) -> int:
+        '''returns 64 bit hash of the canonical link'''
+        canonical = canonicalize_url(url) or url
+        digest = hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
@@ -0,0 +1,335 @@
+'''
+worker pool processes sites in separate processes. Workers pull single
+sites from a shared queue, so a slow site never keeps other workers idle
+'''
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from src.crawl_journal import FAILED, IN_FLIGHT, CrawlJournal
+from src.fetch_engine import FetchEngine
+from src.metrics import METRICS, MetricsReporter, profiled
+from src.settings import Settings
+from src.site_group import SiteGroup
+
+# time between two checks whether the pool should grow or shrink, and the
+# time after a change before the next one, so a new worker warms up first
+ADAPT_INTERVAL = 5
+ADAPT_COOLDOWN = 2 * ADAPT_INTERVAL
+# a worker is only added while the cpu share of the pool stays this much below
+# max_cpu_load, so the pool does not retire the worker it just added
+LOAD_HYSTERESIS = 0.1
+# time between two usage reports of a worker
+USAGE_INTERVAL = 1
+
+
+async def scrape_site(
+    link: str,
+    settings: Settings,
+    engine: FetchEngine,
+    journal: Optional[CrawlJournal] = None,
+) -> Tuple[str, Any]:
+    '''
+    scrapes a single site group, returns its link and combined dictionary
+    if a journal is given, the site and its pages are recorded in it
+    '''
+    site_group = SiteGroup(link=link, settings=settings, journal=journal)
+    if journal:
+        journal.update_site(site_group.link, IN_FLIGHT)
+
+    try:
+        await site_group.run(engine)
+    except Exception as err:  # pylint: disable=broad-except
+        print(f'Could not scrape {link} due to the following error: {err}')
+        if journal:
+            journal.update_site(site_group.link, FAILED, f'error: {err}')
+        return site_group.link, None
+
+    return site_group.link, site_group.combined_dict
+
+
+class PoolUsage():
+    '''
+    class sums cpu time and requests in flight of all workers of a pool,
+    workers add their usage to values shared with the pool
+    '''
+
+    def __init__(self) -> None:
+        self._cpu_time: Any = multiprocessing.Value('d', 0)
+        self._in_flight: Any = multiprocessing.Value('i', 0)
+
+    @property
+    def cpu_time(self) -> float:
+        '''cpu seconds used by all workers so far'''
+        return self._cpu_time.value
+
+    @property
+    def in_flight(self) -> int:
+        '''requests in flight of all workers'''
+        return self._in_flight.value
+
+    def add(self, cpu_time: float, in_flight: int) -> None:
+        '''adds cpu time used by a worker and the change of its requests in flight'''
+        with self._cpu_time.get_lock():
+            self._cpu_time.value += cpu_time
+        with self._in_flight.get_lock():
+            self._in_flight.value += in_flight
+
+    def reset(self) -> None:
+        '''starts counting from zero'''
+        self._cpu_time.value = 0
+        self._in_flight.value = 0
+
+
+async def _report_usage(engine: FetchEngine, usage: PoolUsage) -> None:
+    '''adds cpu time and requests in flight of the worker to the pool usage until cancelled'''
+    cpu_time = time.process_time()
+    in_flight = 0
+    try:
+        while True:
+            await asyncio.sleep(USAGE_INTERVAL)
+            now = time.process_time()
+            usage.add(now - cpu_time, engine.scheduler.in_flight - in_flight)
+            cpu_time, in_flight = now, engine.scheduler.in_flight
+    finally:
+        usage.add(time.process_time() - cpu_time, -in_flight)
+
+
+async def _consume_sites(
+    settings: Settings,
+    n_processes: Any,
+    task_queue: multiprocessing.Queue,
+    result_queue: multiprocessing.Queue,
+    retire: Any,
+    usage: PoolUsage,
+) -> None:
+    '''
+    pulls sites from the task queue as long as the worker has free capacity
+    the worker stops pulling and finishes its sites once the pool asks one
+    worker to retire. Its usage is reported to the pool meanwhile
+    '''
+    loop = asyncio.get_running_loop()
+    local_queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    def take_retirement() -> bool:
+        with retire.get_lock():
+            if retire.value <= 0:
+                return False
+            retire.value -= 1
+            return True
+
+    async def feed() -> None:
+        while True:
+            if take_retirement():
+                print(f'Worker {os.getpid()} retires')
+                break
+            link = await loop.run_in_executor(None, task_queue.get)
+            if link is None:
+                break
+            await local_queue.put(link)
+
+        for _ in range(settings.sites_per_worker):
+            await local_queue.put(None)
+
+    async def consume(engine: FetchEngine, journal: Optional[CrawlJournal]) -> None:
+        while True:
+            link = await local_queue.get()
+            if link is None:
+                return
+            result_queue.put(await scrape_site(link, settings, engine, journal))
+
+    journal_context = CrawlJournal(settings.journal_path) if settings.journal_path \
+        else nullcontext()
+    async with FetchEngine(settings, n_processes) as engine:
+        report_task = asyncio.create_task(_report_usage(engine, usage))
+        try:
+            with journal_context as journal:
+                await asyncio.gather(
+                    feed(),
+                    *(consume(engine, journal) for _ in range(settings.sites_per_worker)),
+                )
+        finally:
+            report_task.cancel()
+            await asyncio.gather(report_task, return_exceptions=True)
+        print(f'Worker {os.getpid()} is done, scheduler: {engine.scheduler.stats()}')
+
+
+def _worker_main(
+    settings: Settings,
+    n_processes: Any,
+    task_queue: multiprocessing.Queue,
+    result_queue: multiprocessing.Queue,
+    retire: Any,
+    usage: PoolUsage,
+) -> None:
+    '''
+    entry point of a worker process, runs a single event loop. Metrics
+    inherited from the main process are dropped, the worker reports its own.
+    `n_processes` is the shared number of live workers of the pool
+    '''
+    METRICS.clear()
+    with MetricsReporter(settings), profiled(settings):
+        asyncio.run(_consume_sites(
+            settings, n_processes, task_queue, result_queue, retire, usage))
+
+
+class SitePool():
+    '''
+    class runs site groups in a pool of worker processes
+
+    The pool starts with `n_workers` processes and adapts to its own usage,
+    the cpu time its workers used since the last check and their requests in
+    flight. It adds workers up to `max_workers` while sites are waiting, one
+    more worker would keep the cpu share of the pool `LOAD_HYSTERESIS` below
+    `max_cpu_load` and less than `max_network_load` of `max_connections` are in
+    flight, more workers would only split a saturated connection budget. While
+    the cpu share of the pool is above `max_cpu_load` it retires workers down
+    to a single one, a retired worker finishes its sites before it stops. After
+    every change the pool waits `ADAPT_COOLDOWN` seconds. Every worker takes its
+    share of `max_connections` from the number of live workers, so the global
+    in-flight budget is used by a pool of any size.
+    '''
+    settings: Settings
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        cpu_count = os.cpu_count() or 1
+        self.max_workers = settings.max_workers or 2 * cpu_count
+        self.n_workers = min(settings.n_workers or cpu_count, self.max_workers)
+        self._workers: List[multiprocessing.Process] = []
+        self._task_queue: Union[multiprocessing.Queue, Any] = None
+        self._result_queue: Union[multiprocessing.Queue, Any] = None
+        # number of live workers and of workers asked to retire, shared with the workers
+        self._live: Any = multiprocessing.Value('i', 0)
+        self._retire: Any = multiprocessing.Value('i', 0)
+        self._usage = PoolUsage()
+        self._cpu_count = cpu_count
+        self._last_check = 0.
+        self._last_cpu_time = 0.
+        self._last_change = 0.
+
+    @property
+    def live_workers(self) -> int:
+        '''number of workers that are not retiring'''
+        return self._live.value
+
+    def imap(self, site_links: List[str]) -> Iterator[Tuple[str, Dict]]:
+        '''yields link and combined dictionary of every site as soon as it is done'''
+        if not site_links:
+            return
+
+        self._task_queue = multiprocessing.Queue()
+        self._result_queue = multiprocessing.Queue()
+        self._live.value = 0
+        self._retire.value = 0
+        self._usage.reset()
+        self._last_check = self._last_change = time.monotonic()
+        self._last_cpu_time = 0.
+        for link in site_links:
+            self._task_queue.put(link)
+
+        for _ in range(self.n_workers):
+            self._add_worker()
+
+        pending = len(site_links)
+        try:
+            while pending:
+                try:
+                    link, combined_dict = self._result_queue.get(timeout=1)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in self._workers):
+                        print(f'All workers stopped, {pending} sites were not scraped')
+                        return
+                else:
+                    pending -= 1
+                    if combined_dict is not None:
+                        yield link, combined_dict
+
+                if time.monotonic() - self._last_check > ADAPT_INTERVAL:
+                    self._adapt(pending)
+        finally:
+            self._stop(pending)
+
+    def _add_worker(self) -> None:
+        '''starts a new worker process'''
+        with self._live.get_lock():
+            self._live.value += 1
+        worker = multiprocessing.Process(
+            target=_worker_main,
+            args=(self.settings, self._live,
+                  self._task_queue, self._result_queue, self._retire, self._usage),
+            daemon=True,
+        )
+        worker.start()
+        self._workers.append(worker)
+        # sentinels are queued after all sites, one for each worker
+        self._task_queue.put(None)
+
+    def _retire_worker(self) -> None:
+        '''asks one worker to stop pulling sites, its share goes to the others'''
+        with self._live.get_lock():
+            self._live.value -= 1
+        with self._retire.get_lock():
+            self._retire.value += 1
+
+    def get_cpu_load(self) -> float:
+        '''
+        returns share of all cpus used by the workers since the last call, the
+        load of other processes of the machine does not count
+        '''
+        now = time.monotonic()
+        cpu_time = self._usage.cpu_time
+        elapsed = max(now - self._last_check, 1e-6)
+        cpu_load = (cpu_time - self._last_cpu_time) / (elapsed * self._cpu_count)
+        self._last_check, self._last_cpu_time = now, cpu_time
+        return cpu_load
+
+    def _adapt(self, pending: int) -> None:
+        '''
+        retires a worker if the pool takes more cpu than it may, adds one if
+        sites are waiting and neither the cpu nor the connection budget would
+        be saturated by it
+        '''
+        cpu_load = self.get_cpu_load()
+        now = time.monotonic()
+        if now - self._last_change < ADAPT_COOLDOWN:
+            return
+
+        n_workers = self.live_workers
+        if cpu_load > self.settings.max_cpu_load:
+            if n_workers > 1:
+                self._retire_worker()
+                self._last_change = now
+            return
+
+        if n_workers >= self.max_workers:
+            return
+
+        if pending <= n_workers * self.settings.sites_per_worker:
+            return
+
+        if cpu_load * (n_workers + 1) / max(1, n_workers) > \
+                self.settings.max_cpu_load - LOAD_HYSTERESIS:
+            return
+
+        if self._usage.in_flight >= self.settings.max_network_load * self.settings.max_connections:
+            return
+
+        self._add_worker()
+        self._last_change = now
+
+    def _stop(self, pending: int) -> None:
+        '''waits for the workers to finish, terminates them if sites are left'''
+        for worker in self._workers:
+            if pending:
+                worker.terminate()
+            worker.join(timeout=self.settings.site_group_deadline)
+            if worker.is_alive():
+                worker.terminate()
+
+        self._workers = []
@@ -0,0 +1,60 @@
+'''shared fixtures of the tests'''
+import asyncio
+import socket
+from pathlib import Path
+
+import pytest
+import yaml
+
+from src.dns_cache import DnsCache
+from src.fetch_engine import FetchEngine
+from src.mock_farm import FarmConfig, MockFarm
+from src.settings import Settings
+from src.worker_pool import scrape_site
+
+SETTINGS_PATH = Path(__file__).parent.parent / 'conf' / 'settings.yml'
+# sites of the farm and child pages of each main page
+N_SITES = 4
+FAN_OUT = 3
+
+
+@pytest.fixture
+def settings(tmp_path: Path) -> Settings:
+    '''project settings writing nothing outside of the temporary directory'''
+    with open(SETTINGS_PATH, 'r', encoding='utf-8') as file:
+        settings = Settings(**yaml.safe_load(file))
+
+    settings.output_path = str(tmp_path / 'scraped_data')
+    settings.journal_path = None
+    settings.cache_path = None
+    settings.metrics_path = None
+    settings.dns_cache_path = str(tmp_path / 'dns_cache.json')
+    settings.fsync = False
+    return settings
+
+
+@pytest.fixture
+def free_port() -> int:
+    '''returns a local port nothing listens on'''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def farm(settings, free_port):
+    '''local farm of synthetic sites, resolved through the dns cache of the settings'''
+    config = FarmConfig(
+        n_sites=N_SITES, port=free_port, fan_out=FAN_OUT, depth=1, page_size=2000,
+        latency=0.02, latency_jitter=0.9, error_rate=0)
+    with MockFarm(config) as farm:
+        farm.seed_dns(DnsCache(
+            settings.dns_ttl, settings.dns_negative_ttl, settings.dns_cache_path))
+        yield farm
+
+
+async def crawl(site_links, settings, journal=None):
+    '''scrapes the sites on one engine, returns link and combined dictionary of each'''
+    async with FetchEngine(settings) as engine:
+        return await asyncio.gather(*(
+            scrape_site(link, settings, engine, journal) for link in site_links))
@@ -0,0 +1,79 @@
+'''tests of reading outputs back, deduplication and the combine step'''
+import os
+from copy import copy
+
+import pyarrow as pa
+import pytest
+
+from combine_results import find_outputs
+from src.result_sink import arrow_schema, deduplicate, get_output_path, make_sink, read_table
+
+
+def make_table(rows, settings):
+    return pa.Table.from_pylist(
+        [{**dict.fromkeys(arrow_schema(settings).names), **row} for row in rows],
+        schema=arrow_schema(settings),
+    )
+
+
+def test_deduplicate_prefers_last_successful_row(settings):
+    table = make_table([
+        {'link': 'a', 'name': 'a1'},
+        {'link': 'b', 'name': 'b1', 'fetch error': 'timeout'},
+        {'link': 'a', 'name': 'a2'},
+        {'link': 'a', 'name': 'a3', 'fetch error': 'timeout'},
+        {'link': 'b', 'name': 'b2', 'fetch error': 'http'},
+        {'link': None, 'name': 'no link'},
+        {'link': 'c', 'name': 'c1'},
+    ], settings)
+
+    rows = deduplicate(table).to_pylist()
+
+    assert [(row['link'], row['name']) for row in rows] == [('a', 'a2'), ('b', 'b2'), ('c', 'c1')]
+
+
+def test_deduplicate_empty_table(settings):
+    assert len(deduplicate(make_table([], settings))) == 0
+
+
+@pytest.mark.parametrize('output_format', ['jsonl', 'sqlite', 'parquet'])
+def test_read_table_aligns_outputs_of_other_settings(settings, output_format):
+    settings.output_format = output_format
+    with make_sink(settings) as sink:
+        sink.write({
+            'link': 'https://a.com/', 'found phones': ['0212345678'],
+            settings.social_links[0]: ['https://linkedin.com/a'],
+            settings.key_words[0]: True, 'fetch status': 200, 'fetch time': 0.5,
+        })
+
+    # a social network and a keyword added after the run, one keyword removed
+    newer = copy(settings)
+    newer.social_links = [*settings.social_links, 'mastodon']
+    newer.key_words = [*settings.key_words[1:], 'Respite']
+    table = read_table(get_output_path(settings), newer)
+
+    assert table.schema == arrow_schema(newer)
+    row = table.to_pylist()[0]
+    assert row['mastodon'] is None
+    assert row['Respite'] is None
+    assert settings.key_words[0] not in row
+    assert row['found phones'] == ['0212345678']
+    assert row[settings.social_links[0]] == ['https://linkedin.com/a']
+    assert row['fetch status'] == 200
+
+
+def test_find_outputs_orders_by_write_time(tmp_path):
+    for name, mtime in (('scraped_data.sqlite', 200), ('extracted_data.sqlite', 300),
+                        ('chunk_1.xlsx', 100), ('export.xlsx', 50),
+                        ('combined_sites.parquet', 400), ('dns_cache.json', 10)):
+        path = tmp_path / name
+        path.touch()
+        os.utime(path, (mtime, mtime))
+    (tmp_path / 'parts').mkdir()
+    (tmp_path / 'parts' / 'part-1.parquet').touch()
+    os.utime(tmp_path / 'parts' / 'part-1.parquet', (250, 250))
+    (tmp_path / 'benchmarks').mkdir()
+    (tmp_path / 'benchmarks' / 'results.jsonl').touch()
+
+    assert [path.name for path in find_outputs(tmp_path)] == [
+        'chunk_1.xlsx', 'scraped_data.sqlite', 'parts', 'extracted_data.sqlite']
@@ -0,0 +1,137 @@
+'''tests of leasing sites to workers of a distributed crawl'''
+import stat
+import time
+from multiprocessing import AuthenticationError
+
+import pytest
+
+import src.coordinator as coordinator
+from src.coordinator import (
+    AUTHKEY_ENV, LEASE_ERROR, SITE_ERROR, LeaseQueue, connect, get_authkey, start_coordinator)
+
+LEASE_TIMEOUT = 0.05
+
+
+def expire():
+    time.sleep(2 * LEASE_TIMEOUT)
+
+
+def drain(lease_queue):
+    results = []
+    while not lease_queue.results.empty():
+        results.append(lease_queue.results.get())
+    return results
+
+
+def test_sites_are_leased_once_in_batches():
+    lease_queue = LeaseQueue(['a', 'b', 'c', 'a'], LEASE_TIMEOUT, 3)
+    first_id, first = lease_queue.lease('w1', 2)
+    second_id, second = lease_queue.lease('w2', 2)
+
+    assert first == ['a', 'b']
+    assert second == ['c']
+    assert first_id != second_id
+    assert lease_queue.lease('w3', 2) == (None, [])
+    assert lease_queue.stats() == {'total': 3, 'pending': 0, 'leased': 3, 'leases': 2, 'done': 0}
+
+
+def test_submitted_results_finish_the_crawl():
+    lease_queue = LeaseQueue(['a', 'b'], 10, 3)
+    lease_id, links = lease_queue.lease('w1', 5)
+    for link in links:
+        assert lease_queue.submit(lease_id, link, {'link': link})
+
+    assert lease_queue.is_finished()
+    assert drain(lease_queue) == [('a', {'link': 'a'}, None), ('b', {'link': 'b'}, None)]
+    assert lease_queue.stats()['leases'] == 0
+
+
+def test_expired_lease_is_requeued_and_late_results_are_refused():
+    lease_queue = LeaseQueue(['a', 'b'], LEASE_TIMEOUT, 3)
+    lease_id, _ = lease_queue.lease('dead worker', 2)
+    assert lease_queue.submit(lease_id, 'a', {'link': 'a'})
+    expire()
+
+    assert not lease_queue.renew(lease_id)
+    assert not lease_queue.submit(lease_id, 'b', {'link': 'b'})
+    new_id, links = lease_queue.lease('w2', 5)
+    assert links == ['b']
+    assert lease_queue.submit(new_id, 'b', {'link': 'b'})
+    assert lease_queue.is_finished()
+    assert [link for link, _, _ in drain(lease_queue)] == ['a', 'b']
+
+
+def test_renewed_lease_does_not_expire():
+    lease_queue = LeaseQueue(['a'], LEASE_TIMEOUT, 3)
+    lease_id, _ = lease_queue.lease('w1', 1)
+    for _ in range(4):
+        time.sleep(LEASE_TIMEOUT / 2)
+        assert lease_queue.renew(lease_id)
+
+    assert lease_queue.submit(lease_id, 'a', {'link': 'a'})
+
+
+def test_sites_are_given_up_after_max_attempts():
+    lease_queue = LeaseQueue(['lost', 'broken'], LEASE_TIMEOUT, 2)
+    for _ in range(2):
+        lease_id, links = lease_queue.lease('w1', 5)
+        assert sorted(links) == ['broken', 'lost']
+        # the worker could not scrape one site and died before the other one
+        assert lease_queue.submit(lease_id, 'broken', None)
+        expire()
+
+    assert lease_queue.is_finished()
+    assert sorted(drain(lease_queue)) == [
+        ('broken', None, SITE_ERROR), ('lost', None, LEASE_ERROR)]
+
+
+@pytest.fixture
+def local_key(tmp_path, monkeypatch):
+    monkeypatch.delenv(AUTHKEY_ENV, raising=False)
+    path = tmp_path / 'coordinator.key'
+    monkeypatch.setattr(coordinator, 'LOCAL_AUTHKEY_PATH', path)
+    return path
+
+
+def test_authkey_is_required_off_loopback(settings, local_key):
+    settings.coordinator_address = '0.0.0.0:8950'
+    with pytest.raises(ValueError):
+        get_authkey(settings, create=True)
+    assert not local_key.exists()
+
+    settings.coordinator_authkey = 'secret'
+    assert get_authkey(settings) == b'secret'
+
+
+def test_authkey_from_environment_comes_first(settings, local_key, monkeypatch):
+    monkeypatch.setenv(AUTHKEY_ENV, 'from env')
+    settings.coordinator_address = '10.0.0.5:8950'
+    settings.coordinator_authkey = 'from settings'
+
+    assert get_authkey(settings) == b'from env'
+
+
+def test_loopback_coordinator_creates_private_key(settings, local_key):
+    settings.coordinator_address = '127.0.0.1:8950'
+    with pytest.raises(ValueError):
+        get_authkey(settings)
+
+    key = get_authkey(settings, create=True)
+
+    assert len(key) == 64
+    assert stat.S_IMODE(local_key.stat().st_mode) == 0o600
+    assert get_authkey(settings) == key
+    assert get_authkey(settings, create=True) != key
+
+
+def test_workers_with_another_key_are_refused(settings, local_key, free_port):
+    settings.coordinator_address = f'127.0.0.1:{free_port}'
+    start_coordinator(LeaseQueue(['a'], 10, 3), settings, b'coordinator key')
+
+    settings.coordinator_authkey = 'other key'
+    with pytest.raises(AuthenticationError):
+        connect(settings)
+
+    settings.coordinator_authkey = 'coordinator key'
+    lease_queue = connect(settings)
+    assert lease_queue.lease('w1', 5)[1] == ['a']
@@ -0,0 +1,37 @@
+'''end to end crawl of a local farm of synthetic sites'''
+import asyncio
+
+from src.crawl_journal import DONE, CrawlJournal
+from src.result_sink import get_output_path, make_sink, read_table
+from tests.conftest import FAN_OUT, N_SITES, crawl
+
+
+def test_crawl_farm(farm, settings, tmp_path):
+    settings.host_rate = 0
+    settings.max_depth = 1
+    settings.journal_path = str(tmp_path / 'journal.db')
+
+    with CrawlJournal(settings.journal_path) as journal:
+        journal.add_sites(farm.site_links)
+        results = asyncio.run(crawl(farm.site_links, settings, journal))
+        with make_sink(settings, on_flush=journal.flush) as sink:
+            for link, combined_dict in results:
+                journal.finish_site(link, combined_dict['fetch error'])
+                sink.write(combined_dict)
+        assert journal.counts()[DONE] == N_SITES
+        assert journal.get_sites() == []
+
+    # every main page and each of its child pages is fetched exactly once
+    assert farm.requests.value == N_SITES * (1 + FAN_OUT)
+    assert [link for link, _ in results] == farm.site_links
+    for link, combined_dict in results:
+        assert combined_dict['fetch error'] is None
+        assert combined_dict['fetch status'] == 200
+        assert len(combined_dict['found phones']) == 1
+        assert combined_dict['found emails'] == [f'info@{link.split("/")[2].split(":")[0]}']
+        assert any(combined_dict[social] for social in settings.social_links)
+        assert any(combined_dict[keyword] for keyword in settings.key_words)
+        assert len(combined_dict['next level links']) == FAN_OUT
+
+    table = read_table(get_output_path(settings), settings)
+    assert sorted(table['link'].to_pylist()) == sorted(farm.site_links)
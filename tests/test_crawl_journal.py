@@ -0,0 +1,77 @@
+'''tests of the crawl journal'''
+from src.crawl_journal import DONE, FAILED, IN_FLIGHT, PENDING, CrawlJournal, PageVersion
+
+
+def test_resume_returns_pending_and_in_flight_sites(tmp_path):
+    with CrawlJournal(tmp_path / 'journal.db') as journal:
+        journal.add_sites(['a', 'b', 'c', 'd'])
+        journal.update_site('b', IN_FLIGHT)
+        journal.finish_site('c')
+        journal.finish_site('d', 'timeout')
+        # finished sites are only written on flush
+        assert journal.get_sites() == ['a', 'b', 'c', 'd']
+        journal.flush()
+
+        assert journal.get_sites() == ['a', 'b']
+        assert journal.counts() == {PENDING: 1, IN_FLIGHT: 1, DONE: 1, FAILED: 1}
+        journal.add_sites(['a', 'e'])
+        assert journal.get_sites() == ['a', 'b', 'e']
+
+
+def test_retry_failed_only_counts_retryable_pages(tmp_path):
+    with CrawlJournal(tmp_path / 'journal.db') as journal:
+        journal.add_sites(['a', 'b', 'c', 'd'])
+        for site in 'abcd':
+            journal.update_site(site, IN_FLIGHT)
+        journal.update_page('a', 'a/missing', FAILED, 'http')
+        journal.update_page('a', 'a/report.pdf', FAILED, 'content type')
+        journal.update_page('b', 'b/slow', FAILED, 'timeout', retryable=True)
+        journal.update_page('c', 'c/ok', DONE)
+        for site in 'abc':
+            journal.finish_site(site)
+        journal.finish_site('d', 'dns')
+        journal.flush()
+
+        assert sorted(journal.get_sites(retry_failed=True)) == ['b', 'd']
+
+        # a site starting again forgets the pages of its previous run
+        journal.update_site('b', IN_FLIGHT)
+        journal.update_page('b', 'b/slow', DONE)
+        journal.finish_site('b')
+        journal.flush()
+        assert journal.get_sites(retry_failed=True) == ['d']
+
+
+def test_retry_failed_skips_sites_whose_main_page_failed_for_good(tmp_path):
+    with CrawlJournal(tmp_path / 'journal.db') as journal:
+        journal.add_sites(['a', 'b', 'c', 'd', 'e'])
+        for site in 'abcde':
+            journal.update_site(site, IN_FLIGHT)
+        journal.update_page('a', 'a', FAILED, 'http')
+        journal.update_page('b', 'b', FAILED, 'robots')
+        journal.update_page('c', 'c', FAILED, 'timeout', retryable=True)
+        journal.update_page('d', 'd', DONE)
+        for site, reason in zip('abc', ('http', 'robots', 'timeout')):
+            journal.finish_site(site, reason)
+        journal.update_site('d', FAILED, 'error: parser')
+        journal.finish_site('e', 'lease expired')
+        journal.flush()
+
+        assert sorted(journal.get_sites(retry_failed=True)) == ['c', 'd', 'e']
+
+
+def test_restart_sites_and_versions(tmp_path):
+    with CrawlJournal(tmp_path / 'journal.db') as journal:
+        journal.add_sites(['a'])
+        journal.finish_site('a')
+        journal.flush()
+        journal.restart_sites()
+        assert journal.get_sites() == ['a']
+
+        version = PageVersion(
+            url='a/about', etag='"v1"', last_modified=None, content_hash='hash',
+            settings_key='key', status=200, record={'name': 'A'}, self_links=['a/team'])
+        journal.put_version(version)
+        assert journal.get_version('a/about', 'key') == version
+        assert journal.get_version('a/about', 'other key') is None
+        assert version.conditional_headers() == {'If-None-Match': '"v1"'}
@@ -0,0 +1,42 @@
+'''tests of the dns cache shared by the worker processes'''
+import asyncio
+
+from src.dns_cache import DnsCache
+from tests.conftest import crawl
+
+ADDRESSES = [{'hostname': 'example.com', 'host': '127.0.0.1', 'port': 80}]
+
+
+def test_cache_is_shared_through_its_file(tmp_path):
+    path = tmp_path / 'dns_cache.json'
+    dns_cache = DnsCache(60, 60, path)
+    dns_cache.put('example.com', ADDRESSES)
+    dns_cache.put_dead('nowhere.invalid', 'dns')
+    dns_cache.save()
+
+    loaded = DnsCache(60, 60, path)
+
+    assert loaded.get('example.com') == ADDRESSES
+    assert loaded.get_error('nowhere.invalid') == 'dns'
+    assert loaded.get_error('example.com') is None
+
+
+def test_entries_expire_after_their_ttl():
+    dns_cache = DnsCache(ttl=-1, negative_ttl=-1)
+    dns_cache.put('example.com', ADDRESSES)
+    dns_cache.put_dead('nowhere.invalid', 'dns')
+
+    assert dns_cache.get('example.com') is None
+    assert dns_cache.get_error('nowhere.invalid') is None
+
+
+def test_dead_domain_fails_without_request(settings):
+    settings.host_rate = 0
+    dns_cache = DnsCache(settings.dns_ttl, settings.dns_negative_ttl, settings.dns_cache_path)
+    dns_cache.put_dead('nowhere.invalid', 'dns')
+    dns_cache.save()
+
+    [(_, combined_dict)] = asyncio.run(crawl(['http://nowhere.invalid/'], settings))
+
+    assert combined_dict['fetch error'] == 'dns'
+    assert combined_dict['fetch status'] is None
@@ -0,0 +1,127 @@
+'''tests of the on-disk response cache and its use by the fetch engine'''
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.fetch_engine import FetchEngine
+from src.http_cache import ResponseCache
+from src.request_utils import FetchResult
+
+URL = 'https://example.com/about'
+HEADERS = {'ETag': '"v1"', 'Last-Modified': 'Mon, 02 Oct 2023 10:00:00 GMT'}
+
+
+@pytest.fixture
+def cached_settings(settings, tmp_path):
+    settings.cache_path = str(tmp_path / 'cache')
+    settings.cache_ttl = 60
+    settings.respect_robots = False
+    settings.host_rate = 0
+    return settings
+
+
+def fetch_pages(settings, urls, answer=None):
+    '''fetches urls through an engine whose requests are answered by `answer`'''
+    requests = []
+
+    async def fetch(url, header, deadline):
+        requests.append((url, header))
+        return answer(url) if answer else FetchResult(url=url, error='connection')
+
+    async def run():
+        async with FetchEngine(settings) as engine:
+            engine._fetch = fetch  # pylint: disable=protected-access
+            return [await engine.get_page_content(url) for url in urls]
+
+    return asyncio.run(run()), requests
+
+
+def age_entry(cache, url, seconds):
+    '''makes the entry of the url look fetched `seconds` ago'''
+    entry = cache.get(url)
+    entry.fetched_at -= seconds
+    cache._write_meta(entry)  # pylint: disable=protected-access
+
+
+def test_entries_are_keyed_by_canonical_url(tmp_path):
+    cache = ResponseCache(tmp_path, ttl=60, max_size=2 ** 20)
+    cache.put('https://www.example.com/about/', 200, HEADERS, 'about us')
+
+    entry = cache.get(URL)
+    assert (entry.status, entry.headers, entry.content) == (200, HEADERS, 'about us')
+    assert entry.conditional_headers() == {
+        'If-None-Match': '"v1"', 'If-Modified-Since': HEADERS['Last-Modified']}
+    assert cache.get('https://example.com/team') is None
+
+
+def test_fresh_entry_is_served_without_request(cached_settings):
+    ResponseCache(cached_settings.cache_path, 60, 2 ** 20).put(URL, 200, HEADERS, 'about us')
+
+    [result], requests = fetch_pages(cached_settings, [URL])
+
+    assert requests == []
+    assert (result.cache, result.content, result.attempts) == ('hit', 'about us', 0)
+
+
+def test_stale_entry_is_revalidated_with_304(cached_settings):
+    cache = ResponseCache(cached_settings.cache_path, 60, 2 ** 20)
+    cache.put(URL, 200, HEADERS, 'about us')
+    age_entry(cache, URL, 120)
+    assert not cache.get(URL).is_fresh(60)
+
+    [result], requests = fetch_pages(
+        cached_settings, [URL], lambda url: FetchResult(url=url, status=304))
+
+    [(_, header)] = requests
+    assert header['If-None-Match'] == '"v1"'
+    assert header['If-Modified-Since'] == HEADERS['Last-Modified']
+    assert (result.cache, result.status, result.content) == ('revalidated', 200, 'about us')
+    # the revalidated entry is fresh again
+    assert cache.get(URL).is_fresh(60)
+
+
+def test_stale_entry_is_replaced_by_changed_page(cached_settings):
+    cache = ResponseCache(cached_settings.cache_path, 60, 2 ** 20)
+    cache.put(URL, 200, HEADERS, 'about us')
+    age_entry(cache, URL, 120)
+
+    [result], _ = fetch_pages(cached_settings, [URL], lambda url: FetchResult(
+        url=url, status=200, content='new about us', headers={'ETag': '"v2"'}))
+
+    assert result.cache is None
+    entry = cache.get(URL)
+    assert (entry.content, entry.etag) == ('new about us', '"v2"')
+    assert entry.is_fresh(60)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path, ttl=60, max_size=250)
+    urls = [f'https://example.com/page{idx}' for idx in range(3)]
+    for idx, url in enumerate(urls[:2]):
+        cache.put(url, 200, {}, 'x' * 100)
+        meta_path, _ = cache._get_paths(url)  # pylint: disable=protected-access
+        os.utime(meta_path, (time.time() - 100 + idx, time.time() - 100 + idx))
+    # reading the first page makes the second one the least recently used
+    assert cache.get(urls[0]) is not None
+
+    cache.put(urls[2], 200, {}, 'x' * 100)
+
+    assert cache.get(urls[1]) is None
+    assert cache.get(urls[0]) is not None
+    assert cache.get(urls[2]) is not None
+
+
+def test_offline_mode_reads_only_the_cache(cached_settings):
+    cache = ResponseCache(cached_settings.cache_path, 60, 2 ** 20)
+    cache.put(URL, 200, HEADERS, 'about us')
+    age_entry(cache, URL, 10 ** 6)
+    cached_settings.offline = True
+
+    [cached, missing], requests = fetch_pages(
+        cached_settings, [URL, 'https://example.com/team'])
+
+    assert requests == []
+    assert (cached.cache, cached.content) == ('hit', 'about us')
+    assert missing.error == 'not cached'
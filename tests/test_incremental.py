@@ -0,0 +1,117 @@
+'''tests of the incremental recrawl: pages that did not change are not extracted again'''
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from src.crawl_journal import CrawlJournal
+from src.fetch_engine import FetchEngine
+from src.request_utils import FetchResult
+from src.site import Site
+
+URL = 'https://example.com/about'
+PAGE = '''<html><body>
+<a href="tel:02 1234 5678">call</a><a href="/team">team</a>
+<p>Aged Care at home</p>
+</body></html>'''
+
+
+@pytest.fixture
+def journal(tmp_path):
+    with CrawlJournal(tmp_path / 'journal.db') as journal:
+        yield journal
+
+
+def crawl_page(settings, journal, answer):
+    '''runs the page through an engine whose requests are answered by `answer`'''
+    settings.respect_robots = False
+    settings.host_rate = 0
+    requests = []
+
+    async def fetch(url, header, deadline):
+        requests.append(header)
+        return answer(url)
+
+    async def run():
+        async with FetchEngine(settings) as engine:
+            engine._fetch = fetch  # pylint: disable=protected-access
+            site = Site(link=URL, settings=settings, check_children=True, journal=journal)
+            await site.run(engine)
+            return site
+
+    return asyncio.run(run()), requests
+
+
+def answer_page(content, etag='"v1"'):
+    return lambda url: FetchResult(url=url, content=content, status=200, headers={'ETag': etag})
+
+
+def forbid_extraction(monkeypatch):
+    def to_dict(_):
+        raise AssertionError('an unchanged page was extracted')
+    monkeypatch.setattr(Site, 'to_dict', to_dict)
+
+
+def test_first_crawl_stores_version(settings, journal):
+    site, requests = crawl_page(settings, journal, answer_page(PAGE))
+
+    assert 'If-None-Match' not in requests[0]
+    assert not site.carried_forward
+    version = journal.get_version(URL, settings.extraction_key)
+    assert version.etag == '"v1"'
+    assert version.content_hash == site.content_hash
+    assert version.record['found phones'] == ['0212345678']
+    assert version.self_links == ['https://example.com/team']
+
+
+def test_not_modified_page_carries_record_forward(settings, journal, monkeypatch):
+    first, _ = crawl_page(settings, journal, answer_page(PAGE))
+    forbid_extraction(monkeypatch)
+
+    site, requests = crawl_page(
+        settings, journal, lambda url: FetchResult(url=url, status=304))
+
+    assert requests[0]['If-None-Match'] == '"v1"'
+    assert site.carried_forward
+    assert site.fetch_result.cache == 'not modified'
+    assert {**site.return_dict, 'fetch time': None} == {**first.return_dict, 'fetch time': None}
+    assert site.self_links == ['https://example.com/team']
+
+
+def test_page_with_same_content_hash_carries_record_forward(settings, journal, monkeypatch):
+    first, _ = crawl_page(settings, journal, answer_page(PAGE))
+    forbid_extraction(monkeypatch)
+
+    # a server ignoring the validators sends the same page again
+    site, _ = crawl_page(settings, journal, answer_page(PAGE, etag='"v2"'))
+
+    assert site.carried_forward
+    assert site.return_dict['fetch status'] == 200
+    assert {**site.return_dict, 'fetch time': None} == {**first.return_dict, 'fetch time': None}
+
+
+def test_changed_page_is_extracted_again(settings, journal):
+    crawl_page(settings, journal, answer_page(PAGE))
+
+    site, _ = crawl_page(settings, journal, answer_page(
+        PAGE.replace('Aged Care', 'Nursing'), etag='"v2"'))
+
+    assert not site.carried_forward
+    assert site.return_dict['Nursing'] is True
+    assert site.return_dict['Aged Care'] is False
+    assert journal.get_version(URL, settings.extraction_key).etag == '"v2"'
+
+
+def test_changed_settings_force_extraction(settings, journal):
+    crawl_page(settings, journal, answer_page(PAGE))
+    newer = replace(settings, key_words=[*settings.key_words, 'at home'])
+    assert newer.extraction_key != settings.extraction_key
+
+    site, requests = crawl_page(newer, journal, answer_page(PAGE))
+
+    # the stored version belongs to other settings, so no validators are sent
+    assert 'If-None-Match' not in requests[0]
+    assert not site.carried_forward
+    assert site.return_dict['at home'] is True
+    assert journal.get_version(URL, newer.extraction_key) is not None
+    assert journal.get_version(URL, settings.extraction_key) is None
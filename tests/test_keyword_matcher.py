@@ -0,0 +1,80 @@
+'''tests of the keyword matcher against the naive per keyword regex it replaced'''
+import random
+import re
+from typing import Dict, List
+
+import pytest
+
+from src.keyword_matcher import KeywordMatcher
+
+KEYWORDS = [
+    'Aged Care', 'Age Care', 'Care', 'Career', 'Caregivers', 'NDIS', 'Nursing',
+    'Personal Care', 'Plan management', 'Support Workers', 'Support Coordination',
+]
+WORDS = ['aged', 'age', 'care', 'career', 'caregivers', 'ndis', 'nursing', 'personal',
+         'plan', 'management', 'support', 'workers', 'coordination', 'home', 'the', 'a']
+
+
+def naive_found(text: str, keywords: List[str]) -> Dict[str, bool]:
+    '''keyword check used before the matcher, one regex per keyword'''
+    return {keyword: re.search(keyword.lower(), text.lower()) is not None for keyword in keywords}
+
+
+def naive_positions(text: str, keyword: str) -> List[int]:
+    '''start of every occurrence of the keyword, overlapping ones included'''
+    text, keyword = text.lower(), keyword.lower()
+    return [idx for idx in range(len(text)) if text.startswith(keyword, idx)]
+
+
+def random_texts(count: int):
+    rng = random.Random(0)
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randrange(1, 40))]
+        words = [word.upper() if rng.random() < 0.2 else word for word in words]
+        yield ''.join(word + rng.choice((' ', '', '. ')) for word in words)
+
+
+def test_found_agrees_with_naive_regex():
+    matcher = KeywordMatcher(KEYWORDS, ignore_whitespace=False)
+    for text in random_texts(500):
+        assert matcher.search(text).found() == naive_found(text, KEYWORDS), text
+
+
+def test_positions_include_overlapping_keywords():
+    matcher = KeywordMatcher(KEYWORDS, ignore_whitespace=False)
+    for text in random_texts(500):
+        matches = matcher.search(text)
+        for keyword in KEYWORDS:
+            assert matches.positions[keyword] == naive_positions(text, keyword), (keyword, text)
+            assert matches.counts[keyword] == len(matches.positions[keyword])
+
+
+def test_keywords_are_literal():
+    matcher = KeywordMatcher(['c++', 'a.b'])
+    assert matcher.search('we use C++ daily').found() == {'c++': True, 'a.b': False}
+    assert matcher.search('a.b').found()['a.b']
+
+
+def test_ignore_whitespace():
+    text = 'Aged\n   care and personal\tcare'
+    assert KeywordMatcher(['Aged Care', 'Personal Care']).search(text).found() == \
+        {'Aged Care': True, 'Personal Care': True}
+    assert KeywordMatcher(['Aged Care'], ignore_whitespace=False).search(text).found() == \
+        {'Aged Care': False}
+
+
+@pytest.mark.parametrize('text, found', [
+    ('career advice', False),
+    ('care, advice', True),
+    ('(care)', True),
+    ('skincare', False),
+])
+def test_word_boundary(text, found):
+    assert KeywordMatcher(['care'], word_boundary=True).search(text).found()['care'] is found
+
+
+def test_empty_text_and_duplicate_keywords():
+    matcher = KeywordMatcher(['NDIS', 'NDIS'])
+    assert matcher.keywords == ['NDIS']
+    assert matcher.search('').found() == {'NDIS': False}
+    assert KeywordMatcher([]).search('anything').found() == {}
@@ -0,0 +1,37 @@
+'''tests of sorting page links into buckets'''
+from src.link_classifier import LinkClassifier
+
+PAGE = 'https://www.example.com/services/'
+
+
+def classify(links):
+    return LinkClassifier('tel:', 'mailto:', ['linkedin', 'facebook']).classify(
+        links, 'https://example.com/services')
+
+
+def test_links_are_sorted_into_buckets():
+    buckets = classify([
+        'tel:+61 2 1234 5678', 'TEL:0212345678', 'mailto:info@example.com',
+        'mailto:info@example.com', 'https://www.linkedin.com/company/example',
+        'https://facebook.com/example', '/about/', '/services/team?ref=nav', 'contact#form',
+        '/brochure.PDF', 'https://other.org/page', PAGE, '/services?utm_source=x',
+    ])
+
+    assert buckets.phones == ['61212345678', '0212345678']
+    assert buckets.emails == ['info@example.com']
+    assert buckets.social == (
+        ['https://linkedin.com/company/example'], ['https://facebook.com/example'])
+    assert buckets.self_links == [
+        'https://example.com/about', 'https://example.com/services/team',
+        'https://example.com/contact',
+    ]
+    assert buckets.external == [
+        'https://linkedin.com/company/example', 'https://facebook.com/example',
+        'https://other.org/page',
+    ]
+    assert len(buckets.links) == len(set(buckets.links))
+
+
+def test_no_links():
+    buckets = classify([])
+    assert buckets.links == [] and buckets.social == ([], [])
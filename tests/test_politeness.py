@@ -0,0 +1,115 @@
+'''tests of host politeness: rate limits, pauses, robots.txt and host eviction'''
+import asyncio
+import time
+from email.utils import formatdate
+
+import pytest
+
+import src.scheduler as scheduler_module
+from src.fetch_engine import FetchEngine
+from src.politeness import HostPolicy, parse_retry_after
+from src.request_utils import FetchResult
+from src.scheduler import FetchScheduler
+
+ROBOTS = '''User-agent: *
+Crawl-delay: 2
+Disallow: /private
+'''
+
+
+def acquire_times(policy, n_requests):
+    '''returns time of every request since the first one asked for its turn'''
+    async def run():
+        start = time.monotonic()
+        times = []
+        for _ in range(n_requests):
+            await policy.acquire()
+            times.append(time.monotonic() - start)
+        return times
+
+    return asyncio.run(run())
+
+
+def test_token_bucket_allows_burst_then_spaces_requests():
+    times = acquire_times(HostPolicy(rate=20, burst=2, max_pause=60), 4)
+
+    assert times[1] < 0.02
+    assert times[2] == pytest.approx(0.05, abs=0.02)
+    assert times[3] == pytest.approx(0.1, abs=0.02)
+
+
+def test_crawl_delay_stretches_interval_without_bursts():
+    policy = HostPolicy(rate=100, burst=5, max_pause=60)
+    policy.set_crawl_delay(0.1)
+
+    times = acquire_times(policy, 3)
+
+    assert times[0] < 0.02
+    assert times[1] == pytest.approx(0.1, abs=0.02)
+    assert times[2] == pytest.approx(0.2, abs=0.03)
+
+
+def test_retry_after_pauses_host_up_to_max_pause():
+    policy = HostPolicy(rate=0, burst=1, max_pause=0.1)
+    policy.report(429, '30')
+
+    assert not policy.is_idle(time.monotonic())
+    assert acquire_times(policy, 1)[0] == pytest.approx(0.1, abs=0.03)
+    policy.report(200)
+    assert policy.strikes == 0
+    assert policy.is_idle(time.monotonic())
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(formatdate(time.time() + 60, usegmt=True)) == \
+        pytest.approx(60, abs=2)
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_robots_disallowed_page_is_not_fetched(settings):
+    settings.host_rate = 0
+    fetched = []
+
+    async def fetch(url, header, deadline):
+        fetched.append(url)
+        if url.endswith('/robots.txt'):
+            return FetchResult(url=url, content=ROBOTS, status=200)
+        return FetchResult(url=url, content='<html></html>', status=200)
+
+    async def run():
+        async with FetchEngine(settings) as engine:
+            engine._fetch = fetch  # pylint: disable=protected-access
+            private = await engine.get_page_content('https://example.com/private/team')
+            public = await engine.get_page_content('https://example.com/about')
+            return engine, private, public
+
+    engine, private, public = asyncio.run(run())
+
+    assert private.error == 'robots'
+    assert public.error is None
+    assert fetched == ['https://example.com/robots.txt', 'https://example.com/about']
+    assert not engine.is_allowed('https://example.com/private')
+    assert engine.scheduler.get_policy('https://example.com/').interval == 2
+
+
+def test_scheduler_forgets_least_recently_used_idle_hosts(settings, monkeypatch):
+    monkeypatch.setattr(scheduler_module, 'MAX_HOSTS', 3)
+    settings.host_rate = 0
+    scheduler = FetchScheduler(settings)
+    paused = scheduler.get_policy('https://paused.com/')
+    paused.report(503, '60')
+
+    async def run():
+        async with scheduler.slot('https://busy.com/'):
+            for idx in range(5):
+                scheduler.get_policy(f'https://site{idx}.com/')
+            assert scheduler.stats()['hosts'] == 3
+            assert scheduler.get_policy('https://busy.com/') is not None
+
+    asyncio.run(run())
+
+    # busy and paused hosts are kept, only the latest idle host fits next to them
+    assert scheduler.get_policy('https://paused.com/') is paused
+    assert scheduler.stats()['hosts'] == 3
@@ -0,0 +1,27 @@
+'''tests of the result sinks'''
+import sqlite3
+
+import pytest
+
+from src.result_sink import ResultSink, get_output_path, make_sink
+
+
+def test_result_sink_is_abstract(settings):
+    with pytest.raises(TypeError):
+        ResultSink(settings)  # pylint: disable=abstract-class-instantiated
+
+
+def test_sqlite_keeps_successful_row_over_failed_one(settings):
+    settings.output_format = 'sqlite'
+    with make_sink(settings) as sink:
+        sink.write({'link': 'a', 'name': 'good'})
+        sink.write({'link': 'a', 'name': 'bad', 'fetch error': 'timeout'})
+        sink.write({'link': 'b', 'name': 'bad', 'fetch error': 'timeout'})
+        sink.write({'link': 'b', 'name': 'good'})
+        sink.write({'link': 'c', 'name': 'old'})
+        sink.write({'link': 'c', 'name': 'new'})
+
+    with sqlite3.connect(get_output_path(settings)) as connection:
+        rows = connection.execute(
+            'SELECT link, name, "fetch error" FROM results ORDER BY link').fetchall()
+    assert rows == [('a', 'good', None), ('b', 'good', None), ('c', 'new', None)]
@@ -0,0 +1,44 @@
+'''tests of fetching and extracting a single page'''
+import asyncio
+
+from src.request_utils import FetchResult
+from src.site import Site
+
+PAGE = '''<html><body>
+<a href="tel:02 1234 5678">call</a><a href="/about">about</a>
+<p>Aged Care at home</p>
+</body></html>'''
+
+
+class SlowEngine():
+    '''engine answering every page after `delay` seconds'''
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+
+    async def get_page_content(self, url, deadline=None, validators=None):
+        await asyncio.sleep(self.delay)
+        return FetchResult(url=url, content=PAGE, status=200)
+
+
+def test_fetched_page_is_extracted(settings):
+    site = Site(link='https://example.com', settings=settings, check_children=True)
+    asyncio.run(site.run(SlowEngine(0)))
+
+    assert site.return_dict['found phones'] == ['0212345678']
+    assert site.return_dict['Aged Care'] is True
+    assert site.self_links == ['https://example.com/about']
+
+
+def test_cancelled_page_is_not_extracted(settings):
+    site = Site(link='https://example.com', settings=settings)
+
+    async def cancel_run():
+        task = asyncio.create_task(site.run(SlowEngine(10)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    assert asyncio.run(cancel_run()).cancelled()
+    assert site.record is None
@@ -0,0 +1,70 @@
+'''tests of crawling a whole site'''
+import asyncio
+
+from src.crawl_journal import DONE, PENDING, CrawlJournal
+from src.request_utils import FetchResult
+from src.site_group import SiteGroup
+from src.url_utils import UrlFrontier
+from tests.conftest import crawl
+
+MAIN_PAGE = '<html><body>{}</body></html>'.format(
+    ''.join(f'<a href="/page{idx}">page {idx}</a>' for idx in range(5)))
+
+
+class SlowChildrenEngine():
+    '''engine answering the main page right away and its child pages after `delay` seconds'''
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.frontier = UrlFrontier()
+        self.finished = []
+
+    def is_allowed(self, url):
+        return True
+
+    async def get_page_content(self, url, deadline=None, validators=None):
+        if url.endswith('/page0') or 'page' not in url:
+            return FetchResult(url=url, content=MAIN_PAGE, status=200)
+        await asyncio.sleep(self.delay)
+        self.finished.append(url)
+        return FetchResult(url=url, content='<html></html>', status=200)
+
+
+def test_crawl_is_deterministic(farm, settings):
+    settings.host_rate = 0
+    settings.max_depth = 1
+    settings.max_site_text = 10 ** 6
+    farm_links = farm.site_links[:2]
+
+    first, second = (
+        [{**combined_dict, 'fetch time': None} for _, combined_dict in results]
+        for results in (asyncio.run(crawl(farm_links, settings)) for _ in range(2))
+    )
+
+    assert first == second
+    assert all(combined_dict['site_text'] for combined_dict in first)
+
+
+def test_cancelled_site_cancels_pages_of_its_level(settings, tmp_path):
+    settings.max_depth = 1
+    engine = SlowChildrenEngine(delay=0.2)
+
+    async def cancel_site(journal):
+        site_group = SiteGroup(link='https://example.com', settings=settings, journal=journal)
+        task = asyncio.create_task(site_group.run(engine))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # pages left running would finish meanwhile
+        await asyncio.sleep(0.3)
+        return task
+
+    with CrawlJournal(tmp_path / 'journal.db') as journal:
+        assert asyncio.run(cancel_site(journal)).cancelled()
+        states = dict(journal._connection.execute(  # pylint: disable=protected-access
+            'SELECT url, state FROM pages'))
+
+    assert engine.finished == []
+    assert states.pop('https://example.com/') == DONE
+    assert states.pop('https://example.com/page0') == DONE
+    assert set(states.values()) == {PENDING}
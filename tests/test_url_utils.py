@@ -0,0 +1,75 @@
+'''tests of link canonicalization and the frontier of seen pages'''
+import pytest
+
+from src.url_utils import UrlFrontier, canonicalize_url, get_host, get_path_depth
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://example.com', 'https://example.com/'),
+    ('HTTPS://WWW.Example.COM/About/', 'https://example.com/About'),
+    ('example.com/about', 'https://example.com/about'),
+    ('//example.com/about', 'https://example.com/about'),
+    ('http://example.com:80/a', 'http://example.com/a'),
+    ('https://example.com:443/a', 'https://example.com/a'),
+    ('https://example.com:8080/a', 'https://example.com:8080/a'),
+    ('localhost:8080/a', 'https://localhost:8080/a'),
+    ('https://example.com//a/./b/../c/', 'https://example.com/a/c'),
+    ('https://example.com/a#team', 'https://example.com/a'),
+    ('https://example.com/a?b=2&a=1', 'https://example.com/a?a=1&b=2'),
+    ('https://example.com/a?utm_source=x&gclid=y&id=3', 'https://example.com/a?id=3'),
+    ('https://example.com/a%20b', 'https://example.com/a%20b'),
+    ('https://example.com/a b', 'https://example.com/a%20b'),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+@pytest.mark.parametrize('url', [
+    None, '', '   ', 'mailto:info@example.com', 'tel:0212345678',
+    'javascript:void(0)', 'ftp://example.com/file', 'https://example.com:99999/',
+])
+def test_canonicalize_url_rejects_non_web_links(url):
+    assert canonicalize_url(url) is None
+
+
+def test_canonicalize_url_resolves_relative_links():
+    base = 'https://example.com/services/home-care'
+    assert canonicalize_url('../about', base) == 'https://example.com/about'
+    assert canonicalize_url('team', base) == 'https://example.com/services/team'
+    assert canonicalize_url('/contact?b=1&a=2', base) == 'https://example.com/contact?a=2&b=1'
+    assert canonicalize_url('/contact?a=1', base, keep_query=False) == \
+        'https://example.com/contact'
+
+
+def test_canonicalize_url_is_idempotent():
+    for url in ('HTTP://WWW.A.com:80//x/../y/?z=1&utm_medium=q#f', 'a.com', '//a.com/b/'):
+        canonical = canonicalize_url(url)
+        assert canonicalize_url(canonical) == canonical
+
+
+def test_get_host_and_depth():
+    assert get_host('https://WWW.Example.com:8080/a') == 'example.com'
+    assert get_host('not a url') == ''
+    assert get_path_depth('https://example.com/') == 0
+    assert get_path_depth('https://example.com/a/b/') == 2
+
+
+def test_frontier_deduplicates_spellings_of_a_page():
+    frontier = UrlFrontier()
+    assert frontier.add('https://www.example.com/about/')
+    assert not frontier.add('HTTPS://example.com/about#team')
+    assert not frontier.add('https://example.com:443/about?utm_source=mail')
+    assert frontier.add('https://example.com/about?page=2')
+    assert 'example.com/about' in frontier
+    assert len(frontier) == 2
+
+
+def test_frontier_filter_keeps_order_of_new_pages():
+    frontier = UrlFrontier()
+    frontier.add('https://example.com/a')
+    urls = [
+        'https://example.com/b', 'https://example.com/a', 'https://example.com/c',
+        'https://www.example.com/b/',
+    ]
+    assert frontier.filter(urls) == ['https://example.com/b', 'https://example.com/c']
+    assert frontier.filter(urls) == []
@@ -0,0 +1,70 @@
+'''tests of the adaptive size of the site pool'''
+import time
+
+import pytest
+
+import src.worker_pool as worker_pool
+from src.worker_pool import ADAPT_COOLDOWN, ADAPT_INTERVAL, SitePool
+
+
+@pytest.fixture
+def pool(settings, monkeypatch):
+    '''pool of 2 workers on 4 cpus that records changes instead of starting processes'''
+    settings.max_workers = 8
+    settings.max_cpu_load = 0.8
+    settings.max_network_load = 0.8
+    settings.max_connections = 100
+    settings.sites_per_worker = 10
+    pool = SitePool(settings)
+    pool._cpu_count = 4  # pylint: disable=protected-access
+    pool._live.value = 2  # pylint: disable=protected-access
+    pool.changes = []
+    monkeypatch.setattr(pool, '_add_worker', lambda: pool.changes.append('add'))
+    monkeypatch.setattr(pool, '_retire_worker', lambda: pool.changes.append('retire'))
+    return pool
+
+
+def run_interval(pool, cpu_time, in_flight=0, since_change=ADAPT_COOLDOWN, pending=1000):
+    '''adapts the pool after workers used `cpu_time` seconds during one interval'''
+    now = time.monotonic()
+    pool._last_check = now - ADAPT_INTERVAL  # pylint: disable=protected-access
+    pool._last_change = now - since_change  # pylint: disable=protected-access
+    pool._usage.reset()  # pylint: disable=protected-access
+    pool._last_cpu_time = 0.  # pylint: disable=protected-access
+    pool._usage.add(cpu_time, in_flight)  # pylint: disable=protected-access
+    pool._adapt(pending)  # pylint: disable=protected-access
+    return pool.changes
+
+
+def test_pool_grows_while_cpu_and_connections_are_free(pool):
+    # 2 workers using a quarter of a cpu each: 12.5% of the machine
+    assert run_interval(pool, cpu_time=0.25 * 2 * ADAPT_INTERVAL) == ['add']
+
+
+def test_pool_does_not_grow_without_waiting_sites(pool):
+    assert run_interval(pool, cpu_time=0, pending=20) == []
+
+
+def test_pool_does_not_grow_when_connections_are_saturated(pool):
+    assert run_interval(pool, cpu_time=0, in_flight=80) == []
+
+
+def test_pool_waits_after_a_change(pool):
+    assert run_interval(pool, cpu_time=0, since_change=ADAPT_INTERVAL) == []
+    assert run_interval(pool, cpu_time=4 * ADAPT_INTERVAL, since_change=ADAPT_INTERVAL) == []
+
+
+def test_pool_keeps_size_between_grow_and_retire_thresholds(pool):
+    # 50% of the machine, a third worker would take it to 75%
+    assert run_interval(pool, cpu_time=0.5 * 4 * ADAPT_INTERVAL) == []
+
+
+def test_pool_retires_workers_above_max_cpu_load_down_to_one(pool):
+    assert run_interval(pool, cpu_time=0.9 * 4 * ADAPT_INTERVAL) == ['retire']
+    pool._live.value = 1  # pylint: disable=protected-access
+    assert run_interval(pool, cpu_time=0.9 * 4 * ADAPT_INTERVAL) == ['retire']
+
+
+def test_load_of_other_processes_does_not_count(pool, monkeypatch):
+    monkeypatch.setattr(worker_pool.os, 'getloadavg', lambda: (64., 64., 64.), raising=False)
+    assert run_interval(pool, cpu_time=0) == ['add']